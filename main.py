@@ -1,11 +1,14 @@
 """Terminal CLI for the CPU-Based Multimodal RAG System."""
+import threading
 import typer
 from pathlib import Path
+from typing import List
 from rich.console import Console
 from rich.panel import Panel
 
-from rag_system.pipeline import ingest_pdf, query, reset
-from rag_system.vector_store import get_stats
+# The rag_system pipeline (Docling, ChromaDB, FastEmbed, FlashRank) is imported
+# inside the commands: PDF worker processes are spawned and re-import this
+# script, so they should not pay for loading it
 
 app = typer.Typer(
     name="rag",
@@ -15,6 +18,27 @@ app = typer.Typer(
 console = Console()
 
 
+def warmup_models(reranker: bool = False) -> List[threading.Thread]:
+    """
+    Load models in background threads so they are resident before they are needed.
+    
+    Loading is quiet so it can't interleave with other output. The threads
+    are not daemons: a first run may be downloading a model, and exiting
+    mid-download would leave a partial model cache behind.
+    
+    Returns:
+        The started threads, for callers that need to wait for them
+    """
+    from rag_system.embedder import get_model
+    from rag_system.reranker import warmup_ranker
+    
+    targets = [get_model] + ([warmup_ranker] if reranker else [])
+    threads = [threading.Thread(target=target, kwargs={"quiet": True}) for target in targets]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
 @app.command()
 def ingest(pdf_path: str = typer.Argument(..., help="Path to PDF file to ingest")):
     """Ingest a PDF document into the RAG system."""
@@ -27,6 +51,11 @@ def ingest(pdf_path: str = typer.Argument(..., help="Path to PDF file to ingest"
         console.print(f"[red]Error: File must be a PDF: {pdf_path}[/red]")
         raise typer.Exit(1)
     
+    from rag_system.pipeline import ingest_pdf
+    
+    # Model loads while the PDF is being parsed
+    warmup_models()
+    
     try:
         stats = ingest_pdf(path)
         console.print(Panel(
@@ -48,6 +77,9 @@ def ask(
     stream: bool = typer.Option(False, "--stream", "-s", help="Stream the response")
 ):
     """Ask a question about the ingested documents."""
+    from rag_system.pipeline import query
+    
+    warmup_models(reranker=True)
     try:
         response = query(question, stream=stream)
     except Exception as e:
@@ -58,6 +90,8 @@ def ask(
 @app.command()
 def clear():
     """Clear all documents from the vector store."""
+    from rag_system.pipeline import reset
+    
     confirm = typer.confirm("Are you sure you want to clear all documents?")
     if confirm:
         reset()
@@ -69,6 +103,8 @@ def clear():
 @app.command()
 def stats():
     """Show statistics about the vector store."""
+    from rag_system.vector_store import get_stats
+    
     info = get_stats()
     console.print(Panel(
         f"[bold]Collection:[/bold] {info['collection_name']}\n"
@@ -80,6 +116,12 @@ def stats():
 @app.command()
 def chat():
     """Start an interactive chat session."""
+    from rag_system.pipeline import ingest_pdf, query, reset
+    from rag_system.vector_store import get_stats
+    
+    # Models load while the banner is shown
+    warmup = warmup_models(reranker=True)
+    
     console.print(Panel(
         "[bold]CPU-Based Multimodal RAG System[/bold]\n\n"
         "Commands:\n"
@@ -91,6 +133,11 @@ def chat():
         title="Interactive Chat"
     ))
     
+    # Finish loading before the first prompt so download progress can't land mid-input
+    with console.status("Loading models..."):
+        for thread in warmup:
+            thread.join()
+    
     while True:
         try:
             user_input = console.input("\n[bold cyan]You:[/bold cyan] ").strip()
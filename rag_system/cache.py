@@ -0,0 +1,85 @@
+"""Persistent caches for vision and LLM results, keyed by content hash."""
+import hashlib
+import sqlite3
+import threading
+from typing import Optional, Tuple
+
+from .config import LLM_MODEL, VISION_MODEL, VISION_CACHE_PATH
+
+# Persistent cache of vision results keyed by image content (lazy opened);
+# the embedding cache lives with the model in embedder.py
+_vision_cache = None
+_vision_cache_lock = threading.Lock()
+
+
+def get_vision_cache() -> sqlite3.Connection:
+    """Get or initialize the on-disk vision result cache."""
+    global _vision_cache
+    if _vision_cache is None:
+        _vision_cache = sqlite3.connect(str(VISION_CACHE_PATH), check_same_thread=False)
+        _vision_cache.execute(
+            "CREATE TABLE IF NOT EXISTS vision "
+            "(hash TEXT PRIMARY KEY, is_formula INTEGER, latex TEXT, description TEXT)"
+        )
+        _vision_cache.execute(
+            "CREATE TABLE IF NOT EXISTS enrichment "
+            "(latex TEXT, ctx_hash TEXT, enriched TEXT, PRIMARY KEY (latex, ctx_hash))"
+        )
+        _vision_cache.commit()
+    return _vision_cache
+
+
+def vision_cache_key(image_bytes: bytes, task: str) -> str:
+    """Cache key for an image analysis, scoped to the vision model and task."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{VISION_MODEL}\0{task}\0".encode("utf-8"))
+    h.update(image_bytes)
+    return h.hexdigest()
+
+
+def vision_cache_get(key: str) -> Optional[Tuple[bool, Optional[str], str]]:
+    """Look up a cached (is_formula, latex, description) result."""
+    with _vision_cache_lock:
+        row = get_vision_cache().execute(
+            "SELECT is_formula, latex, description FROM vision WHERE hash = ?", (key,)
+        ).fetchone()
+    if row is None:
+        return None
+    return bool(row[0]), row[1], row[2]
+
+
+def vision_cache_put(key: str, result: Tuple[bool, Optional[str], str]) -> None:
+    """Persist an (is_formula, latex, description) result."""
+    is_formula, latex, description = result
+    with _vision_cache_lock:
+        cache = get_vision_cache()
+        cache.execute(
+            "INSERT OR REPLACE INTO vision (hash, is_formula, latex, description) VALUES (?, ?, ?, ?)",
+            (key, int(is_formula), latex, description)
+        )
+        cache.commit()
+
+
+def enrichment_cache_key(context: str) -> str:
+    """Hash of the enrichment context, scoped to the LLM that produced the result."""
+    return hashlib.md5(f"{LLM_MODEL}\0{context}".encode("utf-8")).hexdigest()
+
+
+def enrichment_cache_get(latex: str, context_hash: str) -> Optional[str]:
+    """Look up a cached enrichment for (latex, context)."""
+    with _vision_cache_lock:
+        row = get_vision_cache().execute(
+            "SELECT enriched FROM enrichment WHERE latex = ? AND ctx_hash = ?", (latex, context_hash)
+        ).fetchone()
+    return row[0] if row else None
+
+
+def enrichment_cache_put(latex: str, context_hash: str, enriched: str) -> None:
+    """Persist an enrichment result."""
+    with _vision_cache_lock:
+        cache = get_vision_cache()
+        cache.execute(
+            "INSERT OR REPLACE INTO enrichment (latex, ctx_hash, enriched) VALUES (?, ?, ?)",
+            (latex, context_hash, enriched)
+        )
+        cache.commit()
@@ -1,12 +1,20 @@
 """Text chunking for RAG indexing."""
-from typing import List, Dict, Any, Optional
+import re
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from dataclasses import dataclass, field
+import numpy as np
+from tokenizers import Tokenizer
 
-from .config import CHUNK_SIZE, CHUNK_OVERLAP
+from .config import CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_MODEL
 from .parser import ParsedContent
 
+# Embedding model tokenizer (lazy loaded)
+_tokenizer = None
 
-@dataclass
+_WORD_RE = re.compile(r'\S+')
+
+
+@dataclass(slots=True)
 class Chunk:
     """A chunk of text with metadata."""
     content: str
@@ -17,89 +25,118 @@ class Chunk:
     formula_latex: Optional[str] = None  # Original LaTeX for formula chunks
 
 
+def _window_bounds(n: int, size: int, step: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Start/end indices of overlapping windows of `size` items advancing by `step`."""
+    starts = np.arange(0, n, step)
+    ends = np.minimum(starts + size, n)
+    return starts, ends
+
+
+def _words_over(text: str, limit: int) -> bool:
+    """True if `text` has more than `limit` whitespace-separated words; stops counting early."""
+    count = 0
+    for _ in _WORD_RE.finditer(text):
+        count += 1
+        if count > limit:
+            return True
+    return False
+
+
+def get_tokenizer() -> Tokenizer:
+    """Get or initialize the embedding model's tokenizer."""
+    global _tokenizer
+    if _tokenizer is None:
+        _tokenizer = Tokenizer.from_pretrained(EMBEDDING_MODEL)
+        # Chunking needs every token, not the model's 512-token truncated view
+        _tokenizer.no_truncation()
+        _tokenizer.no_padding()
+    return _tokenizer
+
+
 def split_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
     """
     Split text into overlapping chunks.
     
-    Uses a simple word-based splitting to approximate token counts.
+    Windows are measured in real tokens of the embedding model, so each
+    chunk fills (but never exceeds) its context budget. Chunks are sliced
+    from the original text using the tokenizer's character offsets.
     """
     if not text.strip():
         return []
     
-    words = text.split()
-    chunks = []
+    step = chunk_size - overlap
+    if step <= 0:
+        raise ValueError(f"Chunk overlap ({overlap}) must be smaller than chunk size ({chunk_size})")
     
-    # Approximate: 1 token ≈ 0.75 words (so chunk_size tokens ≈ chunk_size * 0.75 words)
-    words_per_chunk = int(chunk_size * 0.75)
-    overlap_words = int(overlap * 0.75)
+    encoding = get_tokenizer().encode(text, add_special_tokens=False)
+    offsets = np.array(encoding.offsets, dtype=np.int64).reshape(-1, 2)
+    if not len(offsets):
+        return []
     
-    start = 0
-    while start < len(words):
-        end = start + words_per_chunk
-        chunk_words = words[start:end]
-        chunks.append(" ".join(chunk_words))
-        start = end - overlap_words
-        
-        if start >= len(words):
-            break
+    starts, ends = _window_bounds(len(offsets), chunk_size, step)
     
-    return chunks
+    return [
+        text[s:e]
+        for s, e in zip(offsets[starts, 0].tolist(), offsets[ends - 1, 1].tolist())
+    ]
 
 
-def create_chunks(parsed: ParsedContent) -> List[Chunk]:
+def create_chunks(parsed: ParsedContent) -> Iterator[Chunk]:
     """
     Create chunks from parsed PDF content.
     
+    Chunks are yielded one at a time so callers can embed and store
+    them in bounded batches instead of staging the whole document.
+    
     Args:
         parsed: ParsedContent from parser
         
-    Returns:
-        List of Chunk objects ready for embedding
+    Yields:
+        Chunk objects ready for embedding
     """
-    chunks = []
     chunk_idx = 0
     
     # Chunk main text
     text_chunks = split_text(parsed.text)
     for text in text_chunks:
-        chunks.append(Chunk(
+        yield Chunk(
             content=text,
             chunk_type="text",
             source_file=parsed.source_file,
             chunk_index=chunk_idx,
             metadata={"type": "text"}
-        ))
+        )
         chunk_idx += 1
     
     # Add tables as individual chunks (preserve structure)
     for i, table in enumerate(parsed.tables):
         # Tables might be large, so chunk them too if needed
-        if len(table.split()) > CHUNK_SIZE:
+        if _words_over(table, CHUNK_SIZE):
             table_chunks = split_text(table)
             for tc in table_chunks:
-                chunks.append(Chunk(
+                yield Chunk(
                     content=f"[TABLE {i + 1}]\n{tc}",
                     chunk_type="table",
                     source_file=parsed.source_file,
                     chunk_index=chunk_idx,
                     metadata={"type": "table", "table_index": i + 1}
-                ))
+                )
                 chunk_idx += 1
         else:
-            chunks.append(Chunk(
+            yield Chunk(
                 content=f"[TABLE {i + 1}]\n{table}",
                 chunk_type="table",
                 source_file=parsed.source_file,
                 chunk_index=chunk_idx,
                 metadata={"type": "table", "table_index": i + 1}
-            ))
+            )
             chunk_idx += 1
     
     # Add image descriptions with path reference
     for img in parsed.images:
         if img.get("description"):
             content = f"[IMAGE: {img['path']}]\n{img['description']}"
-            chunks.append(Chunk(
+            yield Chunk(
                 content=content,
                 chunk_type="image",
                 source_file=parsed.source_file,
@@ -109,12 +146,10 @@ def create_chunks(parsed: ParsedContent) -> List[Chunk]:
                     "image_path": img["path"],
                     "image_index": img.get("index", 0)
                 }
-            ))
+            )
             chunk_idx += 1
     
     # NOTE: Formulas are now inlined in the text by pipeline.py before chunking
     # This means formulas appear in text chunks with their natural context
     # (e.g., "The LQI formula is: $$\Upsilon = ...$$")
     # We no longer need separate formula chunks
-    
-    return chunks
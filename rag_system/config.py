@@ -12,6 +12,8 @@ DATA_DIR = BASE_DIR / "data"
 PDF_DIR = DATA_DIR / "pdfs"
 CHROMA_DIR = DATA_DIR / "chroma_db"
 IMAGE_DIR = DATA_DIR / "images"
+EMBED_CACHE_PATH = DATA_DIR / "embed_cache.sqlite"
+VISION_CACHE_PATH = DATA_DIR / "vision_cache.sqlite"
 
 # Create directories
 for dir_path in [DATA_DIR, PDF_DIR, CHROMA_DIR, IMAGE_DIR]:
@@ -20,24 +22,43 @@ for dir_path in [DATA_DIR, PDF_DIR, CHROMA_DIR, IMAGE_DIR]:
 # Groq API Configuration
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
 
+# ChromaDB Server (optional; empty host uses the local persistent store)
+CHROMA_HOST = os.getenv("CHROMA_HOST", "")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
+
 # Model Configuration
 EMBEDDING_MODEL = "BAAI/bge-small-en-v1.5"
+EMBED_BATCH_SIZE = 128  # Texts per encoder batch (larger batches keep the CPU GEMMs busy)
 RERANKER_MODEL = "ms-marco-MiniLM-L-12-v2"
 
 # Groq Models
 VISION_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"  # For image analysis (Llama 4 Scout)
 LLM_MODEL = "llama-3.3-70b-versatile"  # For text generation (fast on Groq)
 
+# Vision API Concurrency
+VISION_MAX_WORKERS = 8  # Parallel Groq vision requests (keep within rate limits)
+
+# PDF Rendering
+PDF_PROCESS_WORKERS = min(8, os.cpu_count() or 1)  # Processes for CPU-bound page rasterization
+SAVE_FORMULA_IMAGES = False  # Also write vector formula crops to disk (for debugging)
+
 # Chunking Configuration
 CHUNK_SIZE = 500  # tokens
 CHUNK_OVERLAP = 50  # tokens
 
+# Ingestion Configuration
+INGEST_BATCH_SIZE = 512  # Chunks embedded and stored per flush
+
 # Retrieval Configuration
 TOP_K_RETRIEVAL = 15
 TOP_K_RERANK = 5
 
 # ChromaDB Collection
 COLLECTION_NAME = "rag_documents"
+CHROMA_BATCH_SIZE = 512  # Max records per collection.add() call
+HNSW_M = 16  # Graph links per node (applied when the collection is created)
+HNSW_CONSTRUCTION_EF = 100  # Candidate list size while building the index
+HNSW_SEARCH_EF = 64  # Candidate list size per query (>= TOP_K_RETRIEVAL)
 
 # System Prompt for LLM
 SYSTEM_PROMPT = """You are a helpful assistant that answers questions based on the provided context.
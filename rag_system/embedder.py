@@ -1,43 +1,129 @@
-"""Text embeddings using sentence-transformers."""
+"""Text embeddings using FastEmbed (ONNX Runtime, int8-quantized BGE)."""
+import hashlib
+from functools import lru_cache
+import sqlite3
+import threading
 from typing import List
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from fastembed import TextEmbedding
 from rich.console import Console
 
-from .config import EMBEDDING_MODEL
+from .config import EMBEDDING_MODEL, EMBED_BATCH_SIZE, EMBED_CACHE_PATH
 
 console = Console()
 
 # Global model instance (lazy loaded)
 _model = None
+_model_lock = threading.Lock()
 
+# Persistent embedding cache (lazy opened)
+_cache = None
+_cache_lock = threading.Lock()
 
-def get_model() -> SentenceTransformer:
-    """Get or initialize the embedding model."""
+# Cache entries are scoped to the backend + model that produced them
+_CACHE_NAMESPACE = f"fastembed/{EMBEDDING_MODEL}"
+
+# Stay well below SQLite's bound-parameter limit in `IN (...)` lookups
+_CACHE_QUERY_BATCH = 500
+
+
+def get_model(quiet: bool = False) -> TextEmbedding:
+    """
+    Get or initialize the embedding model.
+    
+    Args:
+        quiet: Load without printing progress (for background warmup)
+    """
     global _model
     if _model is None:
-        console.print(f"[blue]Loading embedding model:[/blue] {EMBEDDING_MODEL}")
-        _model = SentenceTransformer(EMBEDDING_MODEL)
-        console.print("[green]✓ Embedding model loaded[/green]")
+        # Guarded so a background warmup and the first real call load it once
+        with _model_lock:
+            if _model is None:
+                if not quiet:
+                    console.print(f"[blue]Loading embedding model:[/blue] {EMBEDDING_MODEL}")
+                _model = TextEmbedding(model_name=EMBEDDING_MODEL)
+                if not quiet:
+                    console.print("[green]✓ Embedding model loaded[/green]")
     return _model
 
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
+def get_cache() -> sqlite3.Connection:
+    """Get or initialize the on-disk embedding cache."""
+    global _cache
+    if _cache is None:
+        _cache = sqlite3.connect(str(EMBED_CACHE_PATH), check_same_thread=False)
+        _cache.execute("CREATE TABLE IF NOT EXISTS cache (hash BLOB PRIMARY KEY, vec BLOB NOT NULL)")
+        _cache.commit()
+    return _cache
+
+
+def _text_hash(text: str) -> bytes:
+    """Cache key for a text, scoped to the embedding model."""
+    return hashlib.sha256((_CACHE_NAMESPACE + "\0" + text).encode("utf-8")).digest()
+
+
+def _load_cached(hashes: List[bytes]) -> dict:
+    """Fetch cached vectors for the given hashes."""
+    cache = get_cache()
+    found = {}
+    with _cache_lock:
+        for start in range(0, len(hashes), _CACHE_QUERY_BATCH):
+            batch = hashes[start:start + _CACHE_QUERY_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = cache.execute(
+                f"SELECT hash, vec FROM cache WHERE hash IN ({placeholders})", batch
+            ).fetchall()
+            for h, vec in rows:
+                found[h] = np.frombuffer(vec, dtype=np.float32)
+    return found
+
+
+def _store_cached(hashes: List[bytes], vectors: np.ndarray) -> None:
+    """Persist newly computed vectors."""
+    cache = get_cache()
+    rows = [(h, v.astype(np.float32).tobytes()) for h, v in zip(hashes, vectors)]
+    with _cache_lock:
+        cache.executemany("INSERT OR REPLACE INTO cache (hash, vec) VALUES (?, ?)", rows)
+        cache.commit()
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
     """
     Generate embeddings for a list of texts.
     
+    Previously embedded texts are served from the on-disk cache;
+    only the uncached subset is sent through the model.
+    
     Args:
         texts: List of text strings to embed
         
     Returns:
-        List of embedding vectors
+        (len(texts), dim) float32 array of embedding vectors
     """
-    model = get_model()
-    embeddings = model.encode(texts, show_progress_bar=len(texts) > 10)
-    return embeddings.tolist()
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+    
+    hashes = [_text_hash(t) for t in texts]
+    cached = _load_cached(list(set(hashes)))
+    
+    embeddings = [cached.get(h) for h in hashes]
+    uncached_idx = [i for i, e in enumerate(embeddings) if e is None]
+    
+    if uncached_idx:
+        if cached:
+            console.print(f"  [dim]{len(texts) - len(uncached_idx)} embeddings loaded from cache[/dim]")
+        model = get_model()
+        uncached_texts = [texts[i] for i in uncached_idx]
+        # FastEmbed returns L2-normalized float32 vectors
+        vectors = np.vstack(list(model.embed(uncached_texts, batch_size=EMBED_BATCH_SIZE)))
+        _store_cached([hashes[i] for i in uncached_idx], vectors)
+        for i, vec in zip(uncached_idx, vectors):
+            embeddings[i] = vec
+    
+    return np.vstack(embeddings)
 
 
-def embed_query(query: str) -> List[float]:
+def embed_query(query: str) -> np.ndarray:
     """
     Generate embedding for a single query.
     
@@ -45,8 +131,16 @@ def embed_query(query: str) -> List[float]:
         query: Query text
         
     Returns:
-        Embedding vector
+        1-D float32 embedding vector (read-only, shared with the query cache)
     """
+    return _embed_query_cached(query, _CACHE_NAMESPACE)
+
+
+@lru_cache(maxsize=1024)
+def _embed_query_cached(query: str, namespace: str) -> np.ndarray:
+    """Encode a query; keyed on the model namespace so config changes miss the cache."""
     model = get_model()
-    embedding = model.encode([query])[0]
-    return embedding.tolist()
+    embedding = np.asarray(next(iter(model.embed([query]))), dtype=np.float32)
+    # Cached arrays are handed out repeatedly, so guard against in-place edits
+    embedding.setflags(write=False)
+    return embedding
@@ -1,26 +1,13 @@
 """LLM generation using Groq API."""
 from typing import List, Dict, Any, Generator
 
-from groq import Groq
 from rich.console import Console
 
-from .config import GROQ_API_KEY, LLM_MODEL, SYSTEM_PROMPT
+from .config import LLM_MODEL, SYSTEM_PROMPT
+from .groq_client import get_client
 
 console = Console()
 
-# Groq client
-_client = None
-
-
-def get_client() -> Groq:
-    """Get or initialize the Groq client."""
-    global _client
-    if _client is None:
-        if not GROQ_API_KEY:
-            raise ValueError("GROQ_API_KEY not set. Please set it in .env file or environment.")
-        _client = Groq(api_key=GROQ_API_KEY)
-    return _client
-
 
 def build_context(results: List[Dict[str, Any]]) -> str:
     """
@@ -63,6 +50,19 @@ def build_context(results: List[Dict[str, Any]]) -> str:
     return "\n\n---\n\n".join(context_parts)
 
 
+def _build_prompt(query: str, context: str) -> str:
+    """Assemble the user prompt around the retrieved context."""
+    return "Context:\n" + context + "\n\nQuestion: " + query + "\n\nAnswer based on the context above:"
+
+
+def _build_messages(query: str, context: str) -> List[Dict[str, str]]:
+    """Chat messages shared by the blocking and streaming calls."""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": _build_prompt(query, context)}
+    ]
+
+
 def generate_response(query: str, context: str) -> str:
     """
     Generate a response using Groq API.
@@ -76,21 +76,11 @@ def generate_response(query: str, context: str) -> str:
     """
     console.print(f"[blue]Generating response with Groq ({LLM_MODEL})...[/blue]")
     
-    prompt = f"""Context:
-{context}
-
-Question: {query}
-
-Answer based on the context above:"""
-    
     try:
         client = get_client()
         response = client.chat.completions.create(
             model=LLM_MODEL,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": prompt}
-            ],
+            messages=_build_messages(query, context),
             max_tokens=1024,
             temperature=0.7
         )
@@ -111,21 +101,11 @@ def stream_response(query: str, context: str) -> Generator[str, None, None]:
     Yields:
         Response chunks
     """
-    prompt = f"""Context:
-{context}
-
-Question: {query}
-
-Answer based on the context above:"""
-    
     try:
         client = get_client()
         stream = client.chat.completions.create(
             model=LLM_MODEL,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": prompt}
-            ],
+            messages=_build_messages(query, context),
             max_tokens=1024,
             temperature=0.7,
             stream=True
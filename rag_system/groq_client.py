@@ -0,0 +1,66 @@
+"""Shared Groq API client."""
+import asyncio
+import threading
+
+import httpx
+from groq import AsyncGroq, Groq
+
+from .config import GROQ_API_KEY
+
+# Groq client shared by generation and vision calls (lazy loaded)
+_client = None
+_client_lock = threading.Lock()
+
+# Connection pool settings shared by the sync and async clients
+_TIMEOUT = 60.0
+_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=32)
+
+
+def get_client() -> Groq:
+    """
+    Get or initialize the shared Groq client.
+    
+    The client is backed by a pooled HTTP/2 httpx client, so TLS
+    handshakes are paid once and concurrent requests reuse keep-alive
+    connections.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if not GROQ_API_KEY:
+                    raise ValueError("GROQ_API_KEY not set. Please set it in .env file or environment.")
+                http_client = httpx.Client(http2=True, timeout=_TIMEOUT, limits=_LIMITS)
+                _client = Groq(api_key=GROQ_API_KEY, http_client=http_client)
+    return _client
+
+
+def create_async_client() -> AsyncGroq:
+    """
+    Create an async Groq client for one batch of concurrent requests.
+    
+    Async connection pools are bound to the event loop that opened them,
+    so callers create one client per asyncio.run() and close it when done
+    (e.g. `async with create_async_client() as client:`).
+    """
+    if not GROQ_API_KEY:
+        raise ValueError("GROQ_API_KEY not set. Please set it in .env file or environment.")
+    http_client = httpx.AsyncClient(http2=True, timeout=_TIMEOUT, limits=_LIMITS)
+    return AsyncGroq(api_key=GROQ_API_KEY, http_client=http_client)
+
+
+def run_with_async_client(func, *args):
+    """
+    Run one async Groq call to completion from synchronous code.
+    
+    `func(client, *args)` is awaited on a client that lives only for this
+    call. Batches should share one client across their requests instead.
+    
+    Raises:
+        ValueError: If no Groq API key is configured
+    """
+    async def run():
+        async with create_async_client() as client:
+            return await func(client, *args)
+    
+    return asyncio.run(run())
@@ -1,18 +1,35 @@
 """Image description using Groq's Llama 3.2 Vision."""
+import asyncio
 import base64
+import itertools
+import re
 from pathlib import Path
 from typing import List, Dict, Any, Tuple, Optional
 
-from groq import Groq
+from groq import AsyncGroq
 from rich.console import Console
 
-from .config import GROQ_API_KEY, VISION_MODEL, IMAGE_ANALYSIS_PROMPT
+from .cache import (
+    enrichment_cache_get, enrichment_cache_key, enrichment_cache_put,
+    vision_cache_get, vision_cache_key, vision_cache_put
+)
+from .config import LLM_MODEL, VISION_MODEL, VISION_MAX_WORKERS, IMAGE_ANALYSIS_PROMPT
+from .groq_client import get_client, create_async_client, run_with_async_client
 from .latex_normalizer import normalize_latex, create_formula_description
 
 console = Console()
 
-# Groq client
-_client = None
+# Docling exports images as `<!-- image -->` (or similar) comments in markdown
+_IMG_PLACEHOLDER_RE = re.compile(r'<!--\s*image\s*-->', re.IGNORECASE)
+
+# Vision responses: "FORMULA: YES" then the LaTeX (optionally fenced), or "FORMULA: NO" then a description
+_FORMULA_YES_RE = re.compile(r'FORMULA:\s*YES\b[^\n]*', re.IGNORECASE)
+# Body of the first code fence; an unterminated fence runs to the end
+_LATEX_FENCE_RE = re.compile(r'```(?:latex)?(.*?)(?:```|\Z)', re.DOTALL | re.IGNORECASE)
+_FORMULA_TAG_LINE_RE = re.compile(r'^.*FORMULA:.*(?:\n|$)', re.MULTILINE | re.IGNORECASE)
+
+# Characters of document text kept on each side of a formula for enrichment
+_CONTEXT_WINDOW_CHARS = 1024
 
 # Prompt for extracting LaTeX from formula images
 FORMULA_EXTRACTION_PROMPT = """Analyze this image carefully. 
@@ -42,37 +59,64 @@ Write a clear, searchable description that would help someone find this formula
 Keep the response concise (3-5 sentences) and include the LaTeX formula at the end."""
 
 
-def enrich_formula_with_context(latex: str, document_text: str) -> str:
+def _nearest_window(document_text: str, latex: str, window: int = _CONTEXT_WINDOW_CHARS) -> str:
+    """
+    Slice the document text around the first occurrence of a formula.
+    
+    Falls back to the top of the document when the LaTeX (or its leading
+    fragment) does not appear verbatim in the text.
+    """
+    pos = -1
+    for fragment in (latex.strip(), latex.strip()[:20]):
+        if fragment:
+            pos = document_text.find(fragment)
+            if pos != -1:
+                break
+    
+    if pos == -1:
+        return document_text[:2 * window]
+    start = max(0, pos - window)
+    return document_text[start:pos + window]
+
+
+def _build_enrichment_prompt(latex: str, context: str) -> str:
+    """Build the enrichment prompt for a formula."""
+    return FORMULA_CONTEXT_PROMPT.format(latex=latex, context=context)
+
+
+async def aenrich_formula_with_context(client: AsyncGroq, latex: str, document_text: str) -> str:
     """
     Use LLM to create a rich description of a formula based on document context.
     
     Args:
+        client: AsyncGroq client shared by the batch
         latex: The extracted LaTeX formula
         document_text: Surrounding text from the document
         
     Returns:
         Enriched description that explains what the formula represents
     """
-    from .config import LLM_MODEL
-    
     try:
-        client = get_client()
+        context = _nearest_window(document_text, latex)
+        context_hash = enrichment_cache_key(context)
+        cached = enrichment_cache_get(latex, context_hash)
+        if cached is not None:
+            return cached
         
-        # Extract relevant context (limit to ~1000 chars around formulas)
-        context = document_text[:2000] if len(document_text) > 2000 else document_text
+        prompt = _build_enrichment_prompt(latex, context)
         
-        prompt = FORMULA_CONTEXT_PROMPT.format(latex=latex, context=context)
-        
-        response = client.chat.completions.create(
+        # Deterministic decoding so cached results match a fresh call
+        response = await client.chat.completions.create(
             model=LLM_MODEL,
             messages=[
                 {"role": "user", "content": prompt}
             ],
-            max_tokens=300,
-            temperature=0.3
+            max_tokens=200,
+            temperature=0
         )
         
         enriched = response.choices[0].message.content.strip()
+        enrichment_cache_put(latex, context_hash, enriched)
         return enriched
         
     except Exception as e:
@@ -81,14 +125,13 @@ def enrich_formula_with_context(latex: str, document_text: str) -> str:
         return f"Mathematical formula: {latex}"
 
 
-def get_client() -> Groq:
-    """Get or initialize the Groq client."""
-    global _client
-    if _client is None:
-        if not GROQ_API_KEY:
-            raise ValueError("GROQ_API_KEY not set. Please set it in .env file or environment.")
-        _client = Groq(api_key=GROQ_API_KEY)
-    return _client
+def enrich_formula_with_context(latex: str, document_text: str) -> str:
+    """Blocking wrapper around aenrich_formula_with_context() for one-off calls."""
+    try:
+        return run_with_async_client(aenrich_formula_with_context, latex, document_text)
+    except ValueError as e:
+        console.print(f"[yellow]Warning: Could not enrich formula context: {e}[/yellow]")
+        return f"Mathematical formula: {latex}"
 
 
 def encode_image_base64(image_path: str | Path) -> str:
@@ -97,6 +140,31 @@ def encode_image_base64(image_path: str | Path) -> str:
         return base64.b64encode(f.read()).decode("utf-8")
 
 
+def _read_image(image_path: str | Path) -> bytes:
+    """Read raw image bytes."""
+    with open(image_path, "rb") as f:
+        return f.read()
+
+
+async def _aread_image(image_path: str | Path) -> bytes:
+    """Read raw image bytes without blocking the event loop."""
+    return await asyncio.to_thread(_read_image, image_path)
+
+
+def _read_image_with_key(image_path: str | Path) -> Tuple[Optional[bytes], str]:
+    """
+    Read an image once and derive its formula-analysis cache key from the same bytes.
+    
+    The key doubles as the duplicate check within a run. Unreadable images
+    get a per-path key (so they are never duplicates of each other) and no bytes.
+    """
+    try:
+        image_bytes = _read_image(image_path)
+    except OSError:
+        return None, f"path:{image_path}"
+    return image_bytes, vision_cache_key(image_bytes, "formula")
+
+
 def get_image_media_type(image_path: str | Path) -> str:
     """Get the media type for an image based on its extension."""
     ext = Path(image_path).suffix.lower()
@@ -110,12 +178,61 @@ def get_image_media_type(image_path: str | Path) -> str:
     return media_types.get(ext, "image/png")
 
 
-def extract_formula_from_image(image_path: str | Path) -> Tuple[bool, Optional[str], str]:
+def _build_vision_messages(prompt: str, image_data: str, media_type: str) -> List[Dict[str, Any]]:
+    """Build a chat message pairing a text prompt with a base64 image."""
+    return [
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": prompt
+                },
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:{media_type};base64,{image_data}"
+                    }
+                }
+            ]
+        }
+    ]
+
+
+def _parse_formula_response(result: str) -> Tuple[bool, Optional[str], str]:
+    """Parse a FORMULA_EXTRACTION_PROMPT response into (is_formula, latex, description)."""
+    # Parse the response to check if it's a formula
+    match = _FORMULA_YES_RE.search(result)
+    if match:
+        # LaTeX is the fenced block if there is one, else everything after the verdict line
+        rest = result[match.end():]
+        fence = _LATEX_FENCE_RE.search(rest)
+        raw_latex = (fence.group(1) if fence else rest).strip()
+        
+        # Normalize the LaTeX
+        normalized = normalize_latex(raw_latex)
+        description = create_formula_description(normalized)
+        
+        return True, raw_latex, description
+    else:
+        # Not a formula - the description is whatever isn't a verdict line
+        description = _FORMULA_TAG_LINE_RE.sub('', result).strip()
+        return False, None, description
+
+
+async def aextract_formula_from_image(client: AsyncGroq, image_path: str | Path, image_bytes: Optional[bytes] = None,
+                                      cache_key: Optional[str] = None) -> Tuple[bool, Optional[str], str]:
     """
     Detect if an image contains a formula and extract LaTeX.
     
+    Results are cached by image content, so unchanged images are
+    not sent to the vision model again on re-ingest.
+    
     Args:
+        client: AsyncGroq client shared by the batch
         image_path: Path to the image file
+        image_bytes: Image content, if the caller already read it
+        cache_key: Vision cache key for image_bytes, if already computed
         
     Returns:
         Tuple of (is_formula, latex_string, description)
@@ -128,63 +245,42 @@ def extract_formula_from_image(image_path: str | Path) -> Tuple[bool, Optional[s
         return False, None, f"[Image not found: {image_path}]"
     
     try:
-        client = get_client()
+        if image_bytes is None:
+            image_bytes = await _aread_image(image_path)
+        if cache_key is None:
+            cache_key = vision_cache_key(image_bytes, "formula")
+        cached = vision_cache_get(cache_key)
+        if cached is not None:
+            return cached
         
         # Encode image to base64
-        image_data = encode_image_base64(image_path)
+        image_data = base64.b64encode(image_bytes).decode("utf-8")
         media_type = get_image_media_type(image_path)
         
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model=VISION_MODEL,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": FORMULA_EXTRACTION_PROMPT
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:{media_type};base64,{image_data}"
-                            }
-                        }
-                    ]
-                }
-            ],
+            messages=_build_vision_messages(FORMULA_EXTRACTION_PROMPT, image_data, media_type),
             max_tokens=500
         )
         
-        result = response.choices[0].message.content
-        
-        # Parse the response to check if it's a formula
-        if "FORMULA: YES" in result.upper():
-            # Extract the LaTeX part (everything after the first line)
-            lines = result.strip().split('\n')
-            latex_lines = [l for l in lines[1:] if l.strip() and "FORMULA:" not in l.upper()]
-            raw_latex = '\n'.join(latex_lines).strip()
-            
-            # Clean up common artifacts
-            raw_latex = raw_latex.replace('```latex', '').replace('```', '').strip()
-            
-            # Normalize the LaTeX
-            normalized = normalize_latex(raw_latex)
-            description = create_formula_description(normalized)
-            
-            return True, raw_latex, description
-        else:
-            # Not a formula - extract description
-            lines = result.strip().split('\n')
-            desc_lines = [l for l in lines if "FORMULA:" not in l.upper()]
-            description = '\n'.join(desc_lines).strip()
-            return False, None, description
-            
+        result = _parse_formula_response(response.choices[0].message.content)
+        vision_cache_put(cache_key, result)
+        return result
+    
     except Exception as e:
         console.print(f"[yellow]Warning: Could not analyze image {image_path.name}: {e}[/yellow]")
         return False, None, f"[Image: {image_path.name}]"
 
 
+def extract_formula_from_image(image_path: str | Path) -> Tuple[bool, Optional[str], str]:
+    """Blocking wrapper around aextract_formula_from_image() for one-off calls."""
+    try:
+        return run_with_async_client(aextract_formula_from_image, image_path)
+    except ValueError as e:
+        console.print(f"[yellow]Warning: Could not analyze image {Path(image_path).name}: {e}[/yellow]")
+        return False, None, f"[Image: {Path(image_path).name}]"
+
+
 def describe_image(image_path: str | Path) -> str:
     """
     Generate a text description of an image using Groq's Llama 3.2 Vision.
@@ -200,40 +296,85 @@ def describe_image(image_path: str | Path) -> str:
         return f"[Image not found: {image_path}]"
     
     try:
+        image_bytes = _read_image(image_path)
+        cache_key = vision_cache_key(image_bytes, "describe")
+        cached = vision_cache_get(cache_key)
+        if cached is not None:
+            return cached[2]
+        
         client = get_client()
         
         # Encode image to base64
-        image_data = encode_image_base64(image_path)
+        image_data = base64.b64encode(image_bytes).decode("utf-8")
         media_type = get_image_media_type(image_path)
         
         response = client.chat.completions.create(
             model=VISION_MODEL,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": IMAGE_ANALYSIS_PROMPT
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:{media_type};base64,{image_data}"
-                            }
-                        }
-                    ]
-                }
-            ],
+            messages=_build_vision_messages(IMAGE_ANALYSIS_PROMPT, image_data, media_type),
             max_tokens=500
         )
-        return response.choices[0].message.content
-        
+        description = response.choices[0].message.content
+        vision_cache_put(cache_key, (False, None, description))
+        return description
+    
     except Exception as e:
         console.print(f"[yellow]Warning: Could not describe image {image_path.name}: {e}[/yellow]")
         return f"[Image: {image_path.name}]"
 
-def process_images(images: List[Dict[str, Any]], document_text: str = "") -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+
+async def _analyze_images(images: List[Dict[str, Any]], document_text: str) -> List[Tuple[tuple, Optional[str]]]:
+    """
+    Analyze all images concurrently.
+    
+    Each image is classified and, if it is a formula, enriched with document
+    context. At most VISION_MAX_WORKERS requests are in flight at once.
+    
+    Returns:
+        One ((is_formula, latex, description), enriched_description) per image, in input order
+    """
+    semaphore = asyncio.Semaphore(VISION_MAX_WORKERS)
+    
+    try:
+        # One client per event loop: async connection pools can't outlive their loop
+        client = create_async_client()
+    except ValueError as e:
+        console.print(f"[yellow]Warning: Could not analyze images: {e}[/yellow]")
+        return [((False, None, f"[Image: {Path(img['path']).name}]"), None) for img in images]
+    
+    async with client:
+        async def analyze(img: Dict[str, Any], image_bytes: Optional[bytes], cache_key: str):
+            async with semaphore:
+                if image_bytes is None:
+                    # Unreadable: let aextract_formula_from_image() report it
+                    analysis = await aextract_formula_from_image(client, img["path"])
+                else:
+                    analysis = await aextract_formula_from_image(client, img["path"], image_bytes, cache_key)
+            
+            is_formula, latex, _ = analysis
+            if not (is_formula and latex):
+                return analysis, None
+            
+            async with semaphore:
+                enriched = await aenrich_formula_with_context(client, latex, document_text)
+            return analysis, enriched
+        
+        # Identical images (repeated logos, headers) are analyzed only once.
+        # Each file is read and hashed once; the bytes and cache key are reused
+        tasks_by_hash: Dict[str, asyncio.Future] = {}
+        pending = []
+        for img in images:
+            image_bytes, key = await asyncio.to_thread(_read_image_with_key, img["path"])
+            if key not in tasks_by_hash:
+                tasks_by_hash[key] = asyncio.ensure_future(analyze(img, image_bytes, key))
+            pending.append(tasks_by_hash[key])
+        
+        if len(tasks_by_hash) < len(images):
+            console.print(f"  [dim]{len(images) - len(tasks_by_hash)} duplicate images skipped[/dim]")
+        
+        return await asyncio.gather(*pending)
+
+
+async def aprocess_images(images: List[Dict[str, Any]], document_text: str = "") -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
     """
     Process all images: classify as formula or regular image.
     
@@ -254,22 +395,19 @@ def process_images(images: List[Dict[str, Any]], document_text: str = "") -> Tup
     
     console.print(f"[blue]Processing {len(images)} images...[/blue]")
     
+    # Vision requests run concurrently; results come back in input order
+    results = await _analyze_images(images, document_text)
+    
     regular_images = []
     formulas = []
     
-    for i, img in enumerate(images):
+    for i, (img, ((is_formula, latex, description), enriched)) in enumerate(zip(images, results)):
         img_index = img.get("index", i + 1)
-        console.print(f"  Analyzing image {img_index}...")
-        
-        # Try to detect if it's a formula
-        is_formula, latex, description = extract_formula_from_image(img["path"])
+        console.print(f"  Image {img_index}:")
         
         if is_formula and latex:
             console.print(f"    [cyan]✓ Formula detected:[/cyan] {latex[:40]}...")
             
-            # Enrich with document context
-            enriched = enrich_formula_with_context(latex, document_text)
-            
             formulas.append({
                 "latex": latex,
                 "normalized": normalize_latex(latex),
@@ -288,6 +426,11 @@ def process_images(images: List[Dict[str, Any]], document_text: str = "") -> Tup
     return regular_images, formulas
 
 
+def process_images(images: List[Dict[str, Any]], document_text: str = "") -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Blocking entry point for aprocess_images(); don't call it from a running event loop."""
+    return asyncio.run(aprocess_images(images, document_text))
+
+
 def inline_formulas_in_markdown(markdown_text: str, formulas: List[Dict[str, Any]]) -> str:
     """
     Replace image placeholders in markdown with LaTeX formulas.
@@ -302,22 +445,9 @@ def inline_formulas_in_markdown(markdown_text: str, formulas: List[Dict[str, Any
     Returns:
         Updated markdown with formulas inlined as $$LaTeX$$
     """
-    import re
-    
     if not formulas:
         return markdown_text
     
-    # Find all image placeholders
-    # Docling uses <!-- image --> or similar patterns
-    placeholder_pattern = r'<!--\s*image\s*-->'
-    
-    # Find all placeholder positions
-    placeholders = list(re.finditer(placeholder_pattern, markdown_text, re.IGNORECASE))
-    
-    if not placeholders:
-        console.print("[yellow]No image placeholders found in markdown[/yellow]")
-        return markdown_text
-    
     # Sort formulas by image_index to match placeholder order
     sorted_formulas = sorted(formulas, key=lambda f: f.get("image_index", 0))
     
@@ -325,18 +455,23 @@ def inline_formulas_in_markdown(markdown_text: str, formulas: List[Dict[str, Any
     # Assumption: formulas appear in the same order as their source images
     formula_by_index = {f["image_index"]: f for f in sorted_formulas}
     
-    # Replace placeholders from end to beginning (to preserve positions)
-    result = markdown_text
-    for i, match in enumerate(reversed(placeholders), 1):
-        placeholder_idx = len(placeholders) - i + 1
-        
-        if placeholder_idx in formula_by_index:
-            formula = formula_by_index[placeholder_idx]
-            latex = formula["latex"]
-            # Replace with display math block
-            replacement = f"\n\n$${latex}$$\n\n"
-            result = result[:match.start()] + replacement + result[match.end():]
-            console.print(f"  [cyan]✓ Inlined formula at position {placeholder_idx}[/cyan]")
+    # Placeholders are numbered by order of appearance, counting from 1
+    placeholder_counter = itertools.count(1)
+    
+    def replace_placeholder(match):
+        placeholder_idx = next(placeholder_counter)
+        formula = formula_by_index.get(placeholder_idx)
+        if formula is None:
+            return match.group(0)
+        console.print(f"  [cyan]✓ Inlined formula at position {placeholder_idx}[/cyan]")
+        # Replace with display math block
+        return f"\n\n$${formula['latex']}$$\n\n"
+    
+    # Single pass over the markdown
+    result, num_placeholders = _IMG_PLACEHOLDER_RE.subn(replace_placeholder, markdown_text)
+    
+    if not num_placeholders:
+        console.print("[yellow]No image placeholders found in markdown[/yellow]")
     
     return result
 
@@ -1,8 +1,107 @@
 """LaTeX formula normalization for consistent embeddings."""
 import re
+from functools import lru_cache
 from typing import List, Tuple
 
+try:
+    # Optional linear-time DFA engine for the whole-document FORMULA_PATTERN scan
+    import re2 as _scan_re
+except ImportError:
+    _scan_re = re
 
+# Patterns are compiled once at import; normalize_latex runs for every formula
+
+_DELIM_RE = re.compile(r'^\$\$?|\$\$?$')
+_WS_RE = re.compile(r'\s+')
+
+# Cheap prechecks used to skip rules that cannot apply
+_LETTER_RUN_RE = re.compile(r'[a-zA-Z]{2,}')
+_OPERATOR_CHARS = frozenset('*<>!~+-')
+_TRIGGER_CHARS = _OPERATOR_CHARS | frozenset('/^_')
+
+# Fractions
+_FRAC_CHAR_RE = re.compile(r'(?<![\\a-zA-Z])([a-zA-Z0-9])/([a-zA-Z0-9])(?![a-zA-Z])')
+_FRAC_PAREN_RE = re.compile(r'\(([^()]+)\)/\(([^()]+)\)')
+
+# Common math functions that should use backslash
+_FUNCTIONS = [
+    'sin', 'cos', 'tan', 'cot', 'sec', 'csc',
+    'sinh', 'cosh', 'tanh', 'coth',
+    'arcsin', 'arccos', 'arctan',
+    'asin', 'acos', 'atan',
+    'log', 'ln', 'exp', 'lg',
+    'lim', 'max', 'min', 'sup', 'inf',
+    'det', 'dim', 'ker', 'deg',
+    'gcd', 'lcm', 'mod',
+    'arg', 'sgn', 'abs'
+]
+# Bare words rewritten to LaTeX commands: the functions, plus 'infinity'
+_WORD_COMMANDS = {func: '\\' + func for func in _FUNCTIONS}
+_WORD_COMMANDS['infinity'] = '\\infty'
+# Match any of them not preceded by backslash, in a single pass
+_FUNCTION_RE = re.compile(
+    r'(?<!\\)\b(' + '|'.join(sorted(_WORD_COMMANDS, key=len, reverse=True)) + r')\b'
+)
+
+# Operators: literal rewrites, applied in order (each may shield text from the next)
+_OPERATOR_SUBS = (
+    ('*', ' \\cdot '),  # Multiplication
+    ('>=', '\\geq'), ('<=', '\\leq'), ('!=', '\\neq'), ('~=', '\\approx'),  # Comparison
+    ('->', '\\rightarrow'), ('<-', '\\leftarrow'), ('=>', '\\Rightarrow'),  # Arrows
+    ('+/-', '\\pm'), ('-/+', '\\mp'),  # Plus/minus
+)
+
+# Roots
+_SQRT_RE = re.compile(r'(?<!\\)sqrt\(([^)]+)\)')
+_CBRT_RE = re.compile(r'(?<!\\)cbrt\(([^)]+)\)')
+_NTHROOT_RE = re.compile(r'(?<!\\)nthroot\((\d+),\s*([^)]+)\)')
+
+# Subscripts / superscripts, all brace-wrapped in one pass:
+# multi-character scripts (x_ab, x^ab), then the common ^2, ^3 and ^n.
+# Exactly one (marker, body) group pair participates per match.
+_SCRIPT_RE = re.compile(
+    r'([_^])([a-zA-Z0-9]{2,})(?![{}])'
+    r'|(\^)([23])(?![{}0-9])'
+    r'|(\^)(n)(?![{}a-zA-Z])'
+)
+
+# Greek letters
+_GREEK_LETTERS = [
+    ('alpha', r'\alpha'), ('beta', r'\beta'), ('gamma', r'\gamma'),
+    ('delta', r'\delta'), ('epsilon', r'\epsilon'), ('zeta', r'\zeta'),
+    ('eta', r'\eta'), ('theta', r'\theta'), ('iota', r'\iota'),
+    ('kappa', r'\kappa'), ('mu', r'\mu'),
+    ('nu', r'\nu'), ('xi', r'\xi'),
+    ('rho', r'\rho'), ('sigma', r'\sigma'), ('tau', r'\tau'),
+    ('upsilon', r'\upsilon'), ('phi', r'\phi'), ('chi', r'\chi'),
+    ('psi', r'\psi'), ('omega', r'\omega'),
+    ('pi', r'\pi'),  # Put after upsilon to avoid matching 'pi' in 'upsilon'
+    ('lambda', r'\lambda'),  # Handle lambda separately
+    # Uppercase
+    ('Gamma', r'\Gamma'), ('Delta', r'\Delta'), ('Theta', r'\Theta'),
+    ('Lambda', r'\Lambda'), ('Xi', r'\Xi'), ('Pi', r'\Pi'),
+    ('Sigma', r'\Sigma'), ('Phi', r'\Phi'), ('Psi', r'\Psi'),
+    ('Omega', r'\Omega')
+]
+# Every command is just the name with a backslash, so a template replacement suffices
+# Only replace if not already a LaTeX command; longest names first in the alternation
+_GREEK_RE = re.compile(
+    r'(?<!\\)\b(' + '|'.join(sorted((name for name, _ in _GREEK_LETTERS), key=len, reverse=True)) + r')\b'
+)
+
+# Math delimiters in one pass. $$...$$ is tried before $...$ at each position,
+# so display math is never also reported as two inline matches.
+# Exactly one group participates; the formula body is match.group(match.lastindex).
+# Inline (?s) flag and no lookarounds, so it compiles under both re and re2.
+FORMULA_PATTERN = _scan_re.compile(
+    r'(?s)\$\$(.+?)\$\$'  # Display math
+    r'|\$(.+?)\$'        # Inline math
+    r'|\\\[(.+?)\\\]'    # Display math alt
+    r'|\\\((.+?)\\\)'    # Inline math alt
+)
+
+
+@lru_cache(maxsize=8192)
 def normalize_latex(latex: str) -> str:
     """
     Normalize LaTeX formula for consistent embedding.
@@ -22,18 +121,32 @@ def normalize_latex(latex: str) -> str:
     normalized = latex.strip()
     
     # Remove surrounding $ or $$ delimiters if present
-    normalized = re.sub(r'^\$\$?|\$\$?$', '', normalized).strip()
+    normalized = _DELIM_RE.sub('', normalized).strip()
     
     # Normalize whitespace
-    normalized = re.sub(r'\s+', ' ', normalized)
-    
-    # Apply normalization rules
-    normalized = _normalize_fractions(normalized)
-    normalized = _normalize_functions(normalized)
-    normalized = _normalize_operators(normalized)
-    normalized = _normalize_roots(normalized)
-    normalized = _normalize_subscripts_superscripts(normalized)
-    normalized = _normalize_greek_letters(normalized)
+    normalized = _WS_RE.sub(' ', normalized)
+    
+    # Every word-based rule (functions, infinity, roots, Greek) needs a 2+ letter run.
+    # Commands inserted by the rules are backslash-prefixed, so they never add one.
+    has_words = _LETTER_RUN_RE.search(normalized) is not None
+    
+    # Trivial formulas (constants, single variables) have nothing to rewrite
+    if not has_words and _TRIGGER_CHARS.isdisjoint(normalized):
+        return normalized.strip()
+    
+    # Apply normalization rules, skipping those that cannot match
+    if '/' in normalized:
+        normalized = _normalize_fractions(normalized)
+    if has_words:
+        normalized = _normalize_functions(normalized)
+    if not _OPERATOR_CHARS.isdisjoint(normalized):
+        normalized = _normalize_operators(normalized)
+    if has_words:
+        normalized = _normalize_roots(normalized)
+    if '_' in normalized or '^' in normalized:
+        normalized = _normalize_subscripts_superscripts(normalized)
+    if has_words:
+        normalized = _normalize_greek_letters(normalized)
     normalized = _normalize_brackets(normalized)
     
     return normalized.strip()
@@ -43,65 +156,28 @@ def _normalize_fractions(latex: str) -> str:
     """Convert simple fractions to \\frac notation."""
     # Handle simple single character fractions: a/b -> \frac{a}{b}
     # Match a single char followed by / followed by a single char
-    pattern = r'(?<![\\a-zA-Z])([a-zA-Z0-9])/([a-zA-Z0-9])(?![a-zA-Z])'
-    result = re.sub(pattern, r'\\frac{\1}{\2}', latex)
+    result = _FRAC_CHAR_RE.sub(r'\\frac{\1}{\2}', latex)
     
     # Handle parenthesized fractions: (expr)/(expr) -> \frac{expr}{expr}
-    pattern = r'\(([^()]+)\)/\(([^()]+)\)'
-    result = re.sub(pattern, r'\\frac{\1}{\2}', result)
+    result = _FRAC_PAREN_RE.sub(r'\\frac{\1}{\2}', result)
     
     return result
 
 
 def _normalize_functions(latex: str) -> str:
     """Ensure standard function notation."""
-    # List of common math functions that should use backslash
-    functions = [
-        'sin', 'cos', 'tan', 'cot', 'sec', 'csc',
-        'sinh', 'cosh', 'tanh', 'coth',
-        'arcsin', 'arccos', 'arctan',
-        'asin', 'acos', 'atan',
-        'log', 'ln', 'exp', 'lg',
-        'lim', 'max', 'min', 'sup', 'inf',
-        'det', 'dim', 'ker', 'deg',
-        'gcd', 'lcm', 'mod',
-        'arg', 'sgn', 'abs'
-    ]
-    
-    result = latex
-    for func in functions:
-        # Match function name not preceded by backslash
-        pattern = r'(?<!\\)\b' + func + r'\b'
-        replacement = '\\' + func
-        result = re.sub(pattern, lambda m: replacement, result)
-    
-    return result
+    # A lookup (not a template) because 'infinity' maps to '\\infty'
+    return _FUNCTION_RE.sub(lambda m: _WORD_COMMANDS[m.group(1)], latex)
 
 
 def _normalize_operators(latex: str) -> str:
     """Normalize mathematical operators."""
     result = latex
     
-    # Multiplication: * -> \cdot
-    result = re.sub(r'\*', r' \\cdot ', result)
-    
-    # Comparison operators
-    result = re.sub(r'>=', r'\\geq', result)
-    result = re.sub(r'<=', r'\\leq', result)
-    result = re.sub(r'!=', r'\\neq', result)
-    result = re.sub(r'~=', r'\\approx', result)
-    
-    # Arrows
-    result = re.sub(r'->', r'\\rightarrow', result)
-    result = re.sub(r'<-', r'\\leftarrow', result)
-    result = re.sub(r'=>', r'\\Rightarrow', result)
-    
-    # Infinity
-    result = re.sub(r'\binfinity\b', r'\\infty', result)
-    
-    # Plus/minus
-    result = re.sub(r'\+/-', r'\\pm', result)
-    result = re.sub(r'-/\+', r'\\mp', result)
+    # Plain substring rewrites don't need the regex engine
+    # ('infinity' is rewritten alongside the function names)
+    for old, new in _OPERATOR_SUBS:
+        result = result.replace(old, new)
     
     return result
 
@@ -109,61 +185,28 @@ def _normalize_operators(latex: str) -> str:
 def _normalize_roots(latex: str) -> str:
     """Normalize square root and nth root notation."""
     # sqrt(x) -> \sqrt{x}
-    result = re.sub(r'(?<!\\)sqrt\(([^)]+)\)', r'\\sqrt{\1}', latex)
+    result = _SQRT_RE.sub(r'\\sqrt{\1}', latex)
     
     # cbrt(x) -> \sqrt[3]{x}
-    result = re.sub(r'(?<!\\)cbrt\(([^)]+)\)', r'\\sqrt[3]{\1}', result)
+    result = _CBRT_RE.sub(r'\\sqrt[3]{\1}', result)
     
     # nthroot(n, x) -> \sqrt[n]{x}
-    result = re.sub(r'(?<!\\)nthroot\((\d+),\s*([^)]+)\)', r'\\sqrt[\1]{\2}', result)
+    result = _NTHROOT_RE.sub(r'\\sqrt[\1]{\2}', result)
     
     return result
 
 
 def _normalize_subscripts_superscripts(latex: str) -> str:
     """Ensure consistent subscript/superscript notation."""
-    # x_ab -> x_{ab} (multi-character subscripts need braces)
-    result = re.sub(r'_([a-zA-Z0-9]{2,})(?![{}])', r'_{\1}', latex)
-    
-    # x^ab -> x^{ab} (multi-character superscripts need braces)
-    result = re.sub(r'\^([a-zA-Z0-9]{2,})(?![{}])', r'^{\1}', result)
-    
-    # Normalize common superscripts
-    result = re.sub(r'\^2(?![{}0-9])', r'^{2}', result)
-    result = re.sub(r'\^3(?![{}0-9])', r'^{3}', result)
-    result = re.sub(r'\^n(?![{}a-zA-Z])', r'^{n}', result)
-    
-    return result
+    # x_ab -> x_{ab}, x^ab -> x^{ab} (multi-character scripts need braces),
+    # x^2 -> x^{2} etc. Unmatched groups expand to '' in the template.
+    return _SCRIPT_RE.sub(r'\1\3\5{\2\4\6}', latex)
 
 
 def _normalize_greek_letters(latex: str) -> str:
     """Ensure Greek letters use proper LaTeX commands."""
-    greek_letters = [
-        ('alpha', r'\alpha'), ('beta', r'\beta'), ('gamma', r'\gamma'),
-        ('delta', r'\delta'), ('epsilon', r'\epsilon'), ('zeta', r'\zeta'),
-        ('eta', r'\eta'), ('theta', r'\theta'), ('iota', r'\iota'),
-        ('kappa', r'\kappa'), ('mu', r'\mu'),
-        ('nu', r'\nu'), ('xi', r'\xi'), 
-        ('rho', r'\rho'), ('sigma', r'\sigma'), ('tau', r'\tau'),
-        ('upsilon', r'\upsilon'), ('phi', r'\phi'), ('chi', r'\chi'),
-        ('psi', r'\psi'), ('omega', r'\omega'),
-        ('pi', r'\pi'),  # Put after upsilon to avoid matching 'pi' in 'upsilon'
-        ('lambda', r'\lambda'),  # Handle lambda separately
-        # Uppercase
-        ('Gamma', r'\Gamma'), ('Delta', r'\Delta'), ('Theta', r'\Theta'),
-        ('Lambda', r'\Lambda'), ('Xi', r'\Xi'), ('Pi', r'\Pi'),
-        ('Sigma', r'\Sigma'), ('Phi', r'\Phi'), ('Psi', r'\Psi'),
-        ('Omega', r'\Omega')
-    ]
-    
-    result = latex
-    for name, cmd in greek_letters:
-        # Only replace if not already a LaTeX command
-        # Use a function replacement to avoid escape issues
-        pattern = r'(?<!\\)\b' + name + r'\b'
-        result = re.sub(pattern, lambda m: cmd, result)
-    
-    return result
+    # Template replacement (a backslash, then the name) runs without a Python callback
+    return _GREEK_RE.sub(r'\\\1', latex)
 
 
 def _normalize_brackets(latex: str) -> str:
@@ -190,21 +233,13 @@ def extract_formulas_from_text(text: str) -> List[Tuple[str, int, int]]:
     """
     formulas = []
     
-    # Match $...$ (inline) and $$...$$ (display) formulas
-    patterns = [
-        r'\$\$(.+?)\$\$',  # Display math
-        r'\$(.+?)\$',      # Inline math
-        r'\\\[(.+?)\\\]',  # Display math alt
-        r'\\\((.+?)\\\)',  # Inline math alt
-    ]
-    
-    for pattern in patterns:
-        for match in re.finditer(pattern, text, re.DOTALL):
-            formulas.append((match.group(0), match.start(), match.end()))
+    for match in FORMULA_PATTERN.finditer(text):
+        formulas.append((match.group(0), match.start(), match.end()))
     
     return formulas
 
 
+@lru_cache(maxsize=8192)
 def create_formula_description(latex: str) -> str:
     """
     Create a natural language description of a formula for embedding.
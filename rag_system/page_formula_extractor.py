@@ -1,15 +1,40 @@
 """Extract formulas from PDF page images using vision model."""
+import base64
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import fitz  # PyMuPDF
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional
 from rich.console import Console
 
-from .config import IMAGE_DIR
-from .image_describer import get_client, encode_image_base64
-from .latex_normalizer import normalize_latex
+from .config import IMAGE_DIR, PDF_PROCESS_WORKERS, VISION_MAX_WORKERS
+from .groq_client import get_client
+from .image_describer import encode_image_base64
+from .latex_normalizer import FORMULA_PATTERN, normalize_latex
+from .pdf_workers import render_page
 
 console = Console()
 
+# PAGE_FORMULA_PROMPT response blocks: FORMULA_START ... FORMULA_END, with an
+# optional LOCATION: line and a LATEX: field that runs until the next LOCATION:
+_BLOCK_START_RE = re.compile(r'FORMULA_START', re.IGNORECASE)
+_BLOCK_END_RE = re.compile(r'FORMULA_END', re.IGNORECASE)
+_LOCATION_LINE_RE = re.compile(r'^[ \t]*LOCATION:[ \t]*(.*?)[ \t]*$', re.MULTILINE | re.IGNORECASE)
+_LATEX_FIELD_RE = re.compile(
+    r'LATEX:\s*(.*?)\s*(?=^[ \t]*LOCATION:|\Z)',
+    re.DOTALL | re.MULTILINE | re.IGNORECASE
+)
+_NO_FORMULAS_RE = re.compile(r'NO_FORMULAS', re.IGNORECASE)
+
+# LaTeX markup (a \command, script or group) that prose between $ signs lacks
+_LATEX_SYNTAX_RE = re.compile(r'\\[A-Za-z]+|[\^_{]')
+
+# Formula placeholders like "$$(F o r m u l e 2.3)$$" or "$$(Formule 2.3)$$"
+_PLACEHOLDER_RE = re.compile(
+    r'\$\$\s*\(\s*[Ff]\s*o?\s*r?\s*m?\s*u?\s*l?\s*e?\s*[\s\\]*(\d+)\s*\.?\s*(\d+)\s*\)\s*\$\$'
+)
+
 # Prompt for finding formulas on a page
 PAGE_FORMULA_PROMPT = """Analyze this PDF page image carefully.
 
@@ -30,57 +55,88 @@ NO_FORMULAS
 Be precise with the LaTeX - include all symbols, subscripts, superscripts, fractions, Greek letters, integrals, etc."""
 
 
-def extract_page_images(pdf_path: Path, dpi: int = 150) -> List[Dict[str, Any]]:
+def extract_page_images(pdf_path: Path, dpi: int = 110,
+                        page_indices: Optional[List[int]] = None) -> List[Dict[str, Any]]:
     """
     Extract images of each page from a PDF.
     
+    Pages are rasterized in parallel across PDF_PROCESS_WORKERS processes.
+    
     Args:
         pdf_path: Path to the PDF file
         dpi: Resolution for rendering pages (higher = better quality but larger)
-        
+        page_indices: 0-based pages to render (default: all pages)
+    
     Returns:
-        List of dicts with 'page_num', 'image_path'
+        List of dicts with 'page_num', 'image_path', 'image_bytes' (PNG)
     """
     pdf_path = Path(pdf_path)
-    doc = fitz.open(pdf_path)
+    if page_indices is None:
+        with fitz.open(pdf_path) as doc:
+            page_indices = list(range(len(doc)))
     
     # Create directory for page images
     pages_dir = IMAGE_DIR / pdf_path.stem / "pages"
     pages_dir.mkdir(parents=True, exist_ok=True)
     
-    page_images = []
+    console.print(f"  [blue]Extracting {len(page_indices)} page images...[/blue]")
     
-    console.print(f"  [blue]Extracting {len(doc)} page images...[/blue]")
+    tasks = [(str(pdf_path), page_num, dpi, str(pages_dir)) for page_num in page_indices]
+    if not tasks:
+        page_images = []
+    else:
+        # Spawned, not forked: the parent may have model-loading threads running
+        with ProcessPoolExecutor(max_workers=min(PDF_PROCESS_WORKERS, len(tasks)),
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            # map() preserves page order
+            page_images = list(executor.map(render_page, tasks, chunksize=4))
     
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        
-        # Render page to image
-        mat = fitz.Matrix(dpi / 72, dpi / 72)  # Scale factor
-        pix = page.get_pixmap(matrix=mat)
-        
-        # Save as PNG
-        image_path = pages_dir / f"page_{page_num + 1}.png"
-        pix.save(str(image_path))
-        
-        page_images.append({
-            "page_num": page_num + 1,
-            "image_path": str(image_path)
-        })
-    
-    doc.close()
     console.print(f"  [green]✓ Extracted {len(page_images)} page images[/green]")
     
     return page_images
 
 
-def extract_formulas_from_page(image_path: str, page_num: int) -> List[Dict[str, Any]]:
+def extract_formulas_from_text_layer(page_text: str, page_num: int) -> List[Dict[str, Any]]:
+    """
+    Extract delimited LaTeX formulas from a page's selectable text.
+    
+    Much cheaper than rendering the page and calling the vision model;
+    works for born-digital PDFs that carry $...$ / \\[...\\] source text.
+    Only matches containing LaTeX markup are kept, so prices like
+    "$5 and $10" don't count as formulas.
+    
+    Args:
+        page_text: Text layer of the page
+        page_num: Page number for reference
+    
+    Returns:
+        List of formulas found: [{latex, location, page_num}]
+    """
+    # Too little text to trust, or no delimiters to find
+    if len(page_text.strip()) < 50 or ('$' not in page_text and '\\' not in page_text):
+        return []
+    
+    formulas = []
+    for match in FORMULA_PATTERN.finditer(page_text):
+        latex = match.group(match.lastindex).strip()
+        if latex and _LATEX_SYNTAX_RE.search(latex):
+            formulas.append({
+                "latex": latex,
+                "normalized": normalize_latex(latex),
+                "location": "text layer",
+                "page_num": page_num
+            })
+    return formulas
+
+
+def extract_formulas_from_page(image_path: str, page_num: int, image_bytes: Optional[bytes] = None) -> List[Dict[str, Any]]:
     """
     Use vision model to find and extract formulas from a page image.
     
     Args:
         image_path: Path to the page image
         page_num: Page number for reference
+        image_bytes: PNG bytes of the page; read from image_path if omitted
         
     Returns:
         List of formulas found: [{latex, location, page_num}]
@@ -90,8 +146,11 @@ def extract_formulas_from_page(image_path: str, page_num: int) -> List[Dict[str,
     try:
         client = get_client()
         
-        # Encode image
-        image_data = encode_image_base64(image_path)
+        # Encode image (from memory when the renderer handed us the bytes)
+        if image_bytes is not None:
+            image_data = base64.b64encode(image_bytes).decode("ascii")
+        else:
+            image_data = encode_image_base64(image_path)
         
         response = client.chat.completions.create(
             model=VISION_MODEL,
@@ -115,38 +174,31 @@ def extract_formulas_from_page(image_path: str, page_num: int) -> List[Dict[str,
         result = response.choices[0].message.content
         
         # Parse the response
-        if "NO_FORMULAS" in result.upper():
+        if _NO_FORMULAS_RE.search(result):
             return []
         
         formulas = []
         
-        # Parse FORMULA_START blocks
-        blocks = result.split("FORMULA_START")
-        for block in blocks[1:]:  # Skip first empty split
-            if "FORMULA_END" in block:
-                content = block.split("FORMULA_END")[0].strip()
-                
-                location = ""
-                latex = ""
-                
-                for line in content.split("\n"):
-                    line = line.strip()
-                    if line.upper().startswith("LOCATION:"):
-                        location = line[9:].strip()
-                    elif line.upper().startswith("LATEX:"):
-                        latex = line[6:].strip()
-                
-                if latex:
-                    # Clean up common artifacts
-                    latex = latex.replace("```latex", "").replace("```", "").strip()
-                    latex = latex.strip("$")
-                    
-                    formulas.append({
-                        "latex": latex,
-                        "normalized": normalize_latex(latex),
-                        "location": location,
-                        "page_num": page_num
-                    })
+        # Parse FORMULA_START blocks; one without FORMULA_END is dropped
+        for block in _BLOCK_START_RE.split(result)[1:]:
+            end = _BLOCK_END_RE.search(block)
+            latex_match = _LATEX_FIELD_RE.search(block, 0, end.start()) if end else None
+            if latex_match is None:
+                continue
+            
+            location_match = _LOCATION_LINE_RE.search(block, 0, end.start())
+            location = location_match.group(1) if location_match else ""
+            # Clean up common artifacts
+            latex = latex_match.group(1).replace("```latex", "").replace("```", "").strip()
+            latex = latex.strip("$")
+            
+            if latex:
+                formulas.append({
+                    "latex": latex,
+                    "normalized": normalize_latex(latex),
+                    "location": location,
+                    "page_num": page_num
+                })
         
         return formulas
         
@@ -159,6 +211,10 @@ def extract_all_page_formulas(pdf_path: Path, max_pages: int = None) -> List[Dic
     """
     Extract all formulas from a PDF by analyzing page images.
     
+    Pages whose text layer already contains delimited LaTeX are handled
+    directly; only the remaining pages are rendered and sent to the
+    vision model.
+    
     Args:
         pdf_path: Path to the PDF file
         max_pages: Optional limit on number of pages to process
@@ -170,23 +226,40 @@ def extract_all_page_formulas(pdf_path: Path, max_pages: int = None) -> List[Dic
     
     console.print(f"\n[bold cyan]Extracting formulas from page images...[/bold cyan]")
     
-    # Extract page images
-    page_images = extract_page_images(pdf_path)
+    # Try each page's text layer first; only pages without results need vision
+    formulas_by_page = {}
+    vision_pages = []
+    with fitz.open(pdf_path) as doc:
+        num_pages = min(len(doc), max_pages) if max_pages else len(doc)
+        for page_idx in range(num_pages):
+            formulas = extract_formulas_from_text_layer(doc[page_idx].get_text(), page_idx + 1)
+            if formulas:
+                formulas_by_page[page_idx + 1] = formulas
+            else:
+                vision_pages.append(page_idx)
     
-    if max_pages:
-        page_images = page_images[:max_pages]
+    if formulas_by_page:
+        console.print(f"  [green]✓ {len(formulas_by_page)} pages resolved from the text layer[/green]")
     
-    all_formulas = []
+    # Extract page images (only for pages the text layer couldn't handle)
+    page_images = extract_page_images(pdf_path, page_indices=vision_pages) if vision_pages else []
     
     console.print(f"  [blue]Analyzing pages for formulas...[/blue]")
     
-    for page_info in page_images:
-        page_num = page_info["page_num"]
-        image_path = page_info["image_path"]
-        
-        console.print(f"    Processing page {page_num}...")
-        
-        formulas = extract_formulas_from_page(image_path, page_num)
+    # Vision calls are network-bound; overlap them and report in page order
+    with ThreadPoolExecutor(max_workers=VISION_MAX_WORKERS) as executor:
+        page_results = list(executor.map(
+            lambda p: extract_formulas_from_page(p["image_path"], p["page_num"], p.get("image_bytes")),
+            page_images
+        ))
+    
+    for page_info, formulas in zip(page_images, page_results):
+        formulas_by_page[page_info["page_num"]] = formulas
+    
+    all_formulas = []
+    for page_num in sorted(formulas_by_page):
+        formulas = formulas_by_page[page_num]
+        console.print(f"    Page {page_num}:")
         
         if formulas:
             console.print(f"      [cyan]✓ Found {len(formulas)} formulas[/cyan]")
@@ -212,13 +285,8 @@ def insert_formulas_into_markdown(markdown_text: str, formulas: List[Dict[str, A
     Returns:
         Updated markdown with actual formulas
     """
-    import re
-    
     result = markdown_text
     
-    # Find formula placeholders like "$$(F o r m u l e 2.3)$$" or "$$(Formule 2.3)$$"
-    placeholder_pattern = r'\$\$\s*\(\s*[Ff]\s*o?\s*r?\s*m?\s*u?\s*l?\s*e?\s*[\s\\]*(\d+)\s*\.?\s*(\d+)\s*\)\s*\$\$'
-    
     # Build a mapping of formula numbers to actual LaTeX
     # This is a heuristic - we match based on order of appearance
     formula_idx = 0
@@ -232,6 +300,6 @@ def insert_formulas_into_markdown(markdown_text: str, formulas: List[Dict[str, A
             return f"\n$$\n{latex}\n$$\n"
         return match.group(0)
     
-    result = re.sub(placeholder_pattern, replace_placeholder, result)
+    result = _PLACEHOLDER_RE.sub(replace_placeholder, result)
     
     return result
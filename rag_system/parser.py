@@ -1,4 +1,6 @@
 """PDF parsing with Docling."""
+import re
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Dict, Any
 from dataclasses import dataclass, field
@@ -11,10 +13,19 @@ from docling.document_converter import PdfFormatOption
 from rich.console import Console
 
 from .config import IMAGE_DIR
-from .latex_normalizer import normalize_latex, create_formula_description
+from .latex_normalizer import FORMULA_PATTERN, normalize_latex, create_formula_description
 
 console = Console()
 
+# Single Greek letters aren't worth a separate formula entry
+_GREEK_SET = frozenset([
+    'alpha', 'beta', 'gamma', 'delta', 'epsilon', 'theta', 'lambda',
+    'mu', 'nu', 'pi', 'sigma', 'tau', 'phi', 'psi', 'omega'
+])
+_SINGLE_LETTER_RE = re.compile(r'^[a-zA-Z]$')
+# Operators, LaTeX structures/functions, sub/superscripts, capital commands like \Upsilon
+_MEANINGFUL_RE = re.compile(r'[+\-*/=<>]|\\(?:frac|int|sum|prod|lim|sqrt|log|sin|cos|tan|[A-Z])|[\^_]')
+
 
 @dataclass
 class ParsedContent:
@@ -26,6 +37,41 @@ class ParsedContent:
     source_file: str = ""
 
 
+def is_meaningful_formula(latex: str) -> bool:
+    """Check if a formula is complex enough to be worth embedding separately."""
+    cleaned = latex.strip()
+    # Skip empty or very short formulas
+    if len(cleaned) < 3:
+        return False
+    # Skip single variables (a, b, x, y, alpha, etc.)
+    if _SINGLE_LETTER_RE.match(cleaned):
+        return False
+    # Skip single Greek letters
+    if cleaned.lower() in _GREEK_SET or cleaned.replace('\\', '').lower() in _GREEK_SET:
+        return False
+    # Should have at least one operator, function, or structural element
+    if _MEANINGFUL_RE.search(cleaned):
+        return True
+    # If it has multiple tokens/words, consider it meaningful
+    return len(cleaned.split()) >= 2 or len(cleaned) > 10
+
+
+@lru_cache(maxsize=4)
+def _get_converter(generate_page_images: bool, generate_picture_images: bool,
+                   do_formula_enrichment: bool) -> DocumentConverter:
+    """Build a Docling converter once per option set; model loading takes seconds."""
+    pipeline_options = PdfPipelineOptions()
+    pipeline_options.generate_page_images = generate_page_images
+    pipeline_options.generate_picture_images = generate_picture_images
+    pipeline_options.do_formula_enrichment = do_formula_enrichment
+    
+    return DocumentConverter(
+        format_options={
+            InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
+        }
+    )
+
+
 def parse_pdf(pdf_path: str | Path, use_marker_method: bool = False, 
                vector_formulas: List[Dict[str, Any]] = None) -> ParsedContent:
     """
@@ -51,16 +97,11 @@ def parse_pdf(pdf_path: str | Path, use_marker_method: bool = False,
     
     console.print(f"[blue]Parsing PDF:[/blue] {pdf_path.name}")
     
-    # Configure pipeline for image and formula extraction
-    pipeline_options = PdfPipelineOptions()
-    pipeline_options.generate_page_images = True
-    pipeline_options.generate_picture_images = True
-    pipeline_options.do_formula_enrichment = True  # Enable LaTeX formula extraction
-    
-    converter = DocumentConverter(
-        format_options={
-            InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
-        }
+    # Configure pipeline for image and formula extraction (reused across PDFs)
+    converter = _get_converter(
+        generate_page_images=True,
+        generate_picture_images=True,
+        do_formula_enrichment=True  # Enable LaTeX formula extraction
     )
     
     # Convert document
@@ -118,62 +159,34 @@ def parse_pdf(pdf_path: str | Path, use_marker_method: bool = False,
             })
             console.print(f"  [cyan]Extracted formula {idx + 1}:[/cyan] {raw_latex[:50]}...")
     
-    # Also extract inline formulas from text using regex patterns
-    import re
-    inline_patterns = [
-        r'\$\$(.+?)\$\$',  # Display math
-        r'\$(.+?)\$',      # Inline math
-        r'\\\[(.+?)\\\]',  # Display math alt
-        r'\\\((.+?)\\\)',  # Inline math alt
-    ]
-    
-    def is_meaningful_formula(latex: str) -> bool:
-        """Check if a formula is complex enough to be worth embedding separately."""
-        cleaned = latex.strip()
-        # Skip empty or very short formulas
-        if len(cleaned) < 3:
-            return False
-        # Skip single variables (a, b, x, y, alpha, etc.)
-        if re.match(r'^[a-zA-Z]$', cleaned):
-            return False
-        # Skip single Greek letters
-        greek = ['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'theta', 'lambda', 
-                 'mu', 'nu', 'pi', 'sigma', 'tau', 'phi', 'psi', 'omega']
-        if cleaned.lower() in greek or cleaned.replace('\\', '').lower() in greek:
-            return False
-        # Should have at least one operator, function, or structural element
-        meaningful_patterns = [
-            r'[+\-*/=<>]',  # Operators
-            r'\\frac', r'\\int', r'\\sum', r'\\prod', r'\\lim',  # LaTeX structures
-            r'\\sqrt', r'\\log', r'\\sin', r'\\cos', r'\\tan',  # Functions
-            r'\^', r'_',  # Subscripts/superscripts
-            r'\\[A-Z]',  # Capital LaTeX commands like \Upsilon
-        ]
-        for pattern in meaningful_patterns:
-            if re.search(pattern, cleaned):
-                return True
-        # If it has multiple tokens/words, consider it meaningful
-        if len(cleaned.split()) >= 2 or len(cleaned) > 10:
-            return True
-        return False
-    
-    for pattern in inline_patterns:
-        for match in re.finditer(pattern, text_content, re.DOTALL):
-            raw_latex = match.group(1).strip()
-            # Skip if already extracted
-            if any(f['raw'] == raw_latex for f in formulas):
-                continue
-            # Skip trivial formulas (single variables)
-            if not is_meaningful_formula(raw_latex):
-                continue
-            normalized = normalize_latex(raw_latex)
-            description = create_formula_description(normalized)
-            formulas.append({
-                "raw": raw_latex,
-                "normalized": normalized,
-                "description": description,
-                "index": len(formulas) + 1
-            })
+    # Also extract inline formulas from text ($$...$$, $...$, \[...\], \(...\))
+    
+    # Already-extracted LaTeX (raw and normalized), kept in lockstep with `formulas`
+    raw_seen = {f['raw'] for f in formulas}
+    norm_seen = {f['normalized'] for f in formulas}
+    
+    for match in FORMULA_PATTERN.finditer(text_content):
+        raw_latex = match.group(match.lastindex).strip()
+        # Skip if already extracted
+        if raw_latex in raw_seen:
+            continue
+        # Skip trivial formulas (single variables)
+        if not is_meaningful_formula(raw_latex):
+            continue
+        normalized = normalize_latex(raw_latex)
+        # Skip spelling variants of a kept formula (e.g. a/b vs \frac{a}{b})
+        if normalized in norm_seen:
+            raw_seen.add(raw_latex)
+            continue
+        description = create_formula_description(normalized)
+        formulas.append({
+            "raw": raw_latex,
+            "normalized": normalized,
+            "description": description,
+            "index": len(formulas) + 1
+        })
+        raw_seen.add(raw_latex)
+        norm_seen.add(normalized)
     
     console.print(f"  [green]Text extracted ({len(text_content)} chars)[/green]")
     console.print(f"  [green]{len(tables)} tables found[/green]")
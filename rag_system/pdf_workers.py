@@ -0,0 +1,131 @@
+"""
+Per-page PDF work run in process pools.
+
+Pool workers are spawned, so each one imports this module fresh. It only
+depends on PyMuPDF and NumPy, keeping worker start-up free of the parsing,
+embedding and vector store stack.
+"""
+import fitz  # PyMuPDF
+import numpy as np
+from pathlib import Path
+from typing import List, Dict, Any, Tuple
+
+# Formula crop rendering: 4x scale for better quality, small padding around the cluster
+_FORMULA_MATRIX = fitz.Matrix(4.0, 4.0)
+_FORMULA_PAD = (-3, -3, 3, 3)
+
+# Near-blank crop detection: pixel std-dev over a strided sample of the raster
+_BLANK_SAMPLE_STRIDE = 8
+_BLANK_STD_THRESHOLD = 2.0
+
+
+def cluster_candidates(clusters: List[fitz.Rect], table_bboxes: List[Tuple], page_height: float) -> np.ndarray:
+    """
+    Vectorized table-overlap and header/footer filter for drawing clusters.
+    
+    Args:
+        clusters: Drawing cluster rectangles from page.cluster_drawings()
+        table_bboxes: Bounding boxes of tables found on the page
+        page_height: Height of the page in points
+    
+    Returns:
+        Boolean mask over clusters; True for rects that are neither more than
+        half covered by tables nor inside the 70pt header/footer bands
+    """
+    rects = np.array([(r.x0, r.y0, r.x1, r.y1) for r in clusters], dtype=np.float64).reshape(-1, 4)
+    x0, y0, x1, y1 = rects.T
+    
+    keep = (y1 >= 70) & (y0 <= page_height - 70)
+    
+    if table_bboxes:
+        tables = np.array(table_bboxes, dtype=np.float64).reshape(-1, 4)
+        # (clusters, tables) pairwise intersection extents, empty ones clipped to zero
+        iw = np.clip(np.minimum(x1[:, None], tables[:, 2]) - np.maximum(x0[:, None], tables[:, 0]), 0, None)
+        ih = np.clip(np.minimum(y1[:, None], tables[:, 3]) - np.maximum(y0[:, None], tables[:, 1]), 0, None)
+        overlap_area = (iw * ih).sum(axis=1)
+        keep &= overlap_area <= (x1 - x0) * (y1 - y0) * 0.5
+    
+    return keep
+
+
+def scan_formula_page(args: Tuple[str, int]) -> List[Dict[str, Any]]:
+    """
+    Find and render the formula candidates on one page.
+    
+    Each call opens its own document handle; fitz objects can't be
+    shared across processes. Crops are rendered from the unmarked page.
+    
+    Returns:
+        One {'rect', 'image_bytes'} dict per candidate, in cluster order
+    """
+    pdf_path, page_num = args
+    candidates = []
+    with fitz.open(pdf_path) as doc:
+        page = doc[page_num]
+        
+        # Find tables to exclude
+        tabs = page.find_tables()
+        table_bboxes = [tab.bbox for tab in tabs.tables]
+        
+        # Find vector drawing clusters
+        clusters = page.cluster_drawings(x_tolerance=30, y_tolerance=4)
+        if not clusters:
+            return candidates
+        
+        # Skip table overlaps (>50%) and header/footer regions
+        keep = cluster_candidates(clusters, table_bboxes, page.rect.height)
+        
+        for rect, kept in zip(clusters, keep):
+            if not kept:
+                continue
+            
+            # Skip very small items
+            width = rect.x1 - rect.x0
+            height = rect.y1 - rect.y0
+            if width < 30 or height < 10:
+                continue
+            
+            pix = page.get_pixmap(matrix=_FORMULA_MATRIX, clip=rect + _FORMULA_PAD)
+            
+            # Skip near-blank images (every 8th row/column is plenty to see ink)
+            samples = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.h, pix.w, pix.n)
+            if samples[::_BLANK_SAMPLE_STRIDE, ::_BLANK_SAMPLE_STRIDE].std() < _BLANK_STD_THRESHOLD:
+                continue
+            
+            candidates.append({
+                "rect": (rect.x0, rect.y0, rect.x1, rect.y1),
+                "image_bytes": pix.tobytes("png")
+            })
+    
+    return candidates
+
+
+def render_page(args: Tuple[str, int, int, str]) -> Dict[str, Any]:
+    """
+    Render one PDF page to a PNG.
+    
+    Each call opens its own document handle; fitz objects can't be
+    shared across processes. The encoded PNG is returned alongside its
+    saved path so the vision call doesn't re-read the file.
+    """
+    pdf_path, page_num, dpi, pages_dir = args
+    doc = fitz.open(pdf_path)
+    try:
+        page = doc[page_num]
+        
+        # Render page to image (8-bit grayscale: color doesn't help formula OCR)
+        mat = fitz.Matrix(dpi / 72, dpi / 72)  # Scale factor
+        pix = page.get_pixmap(matrix=mat, colorspace=fitz.csGRAY, alpha=False)
+        
+        # Encode as PNG once; the same bytes are saved and sent to the vision model
+        image_bytes = pix.tobytes("png")
+        image_path = Path(pages_dir) / f"page_{page_num + 1}.png"
+        image_path.write_bytes(image_bytes)
+    finally:
+        doc.close()
+    
+    return {
+        "page_num": page_num + 1,
+        "image_path": str(image_path),
+        "image_bytes": image_bytes
+    }
@@ -1,4 +1,6 @@
 """Main RAG pipeline orchestration."""
+import asyncio
+from collections import Counter
 from pathlib import Path
 from typing import Dict, Any
 from rich.console import Console
@@ -8,7 +10,7 @@ from .parser import parse_pdf
 from .image_describer import describe_all_images
 from .chunker import create_chunks
 from .embedder import embed_query
-from .vector_store import add_chunks, search, clear_collection, get_stats
+from .vector_store import add_chunks_async, search, clear_collection, get_stats
 from .reranker import rerank
 from .generator import generate_response, build_context, stream_response
 
@@ -42,18 +44,16 @@ def save_image_descriptions_to_markdown(pdf_path: Path, images: list) -> None:
     console.print(f"  [green]✓[/green] Image descriptions added to markdown")
 
 
-def ingest_pdf(pdf_path: str | Path) -> Dict[str, Any]:
+async def aingest_pdf(pdf_path: str | Path) -> Dict[str, Any]:
     """
     Ingest a PDF into the RAG system.
     
     Steps:
-    1. Check for vector formulas
-    2. If vectors found: create marked PDF and extract formulas
-    3. Parse PDF with Docling (marked PDF if applicable)
-    4. Replace markers with LaTeX
-    5. Process images
-    6. Chunk content
-    7. Embed and store in ChromaDB
+    1. Scan for vector formulas; if found, create marked PDF and extract them
+    2. Parse PDF with Docling (marked PDF if applicable)
+    3. Replace markers with LaTeX
+    4. Process images
+    5. Chunk, embed and store in ChromaDB as an overlapped async pipeline
     
     Args:
         pdf_path: Path to PDF file
@@ -64,40 +64,40 @@ def ingest_pdf(pdf_path: str | Path) -> Dict[str, Any]:
     pdf_path = Path(pdf_path)
     console.print(f"\n[bold blue]=== Ingesting PDF: {pdf_path.name} ===[/bold blue]\n")
     
-    # Step 1: Check for vector formulas and prepare marked PDF
-    console.print("[bold]Step 1/5: Checking for Vector Formulas[/bold]")
+    # Step 1: Scan for vector formulas and prepare marked PDF
+    # A single full scan; finding nothing is the negative case, so there is
+    # no separate detection pass over the first pages
+    console.print("[bold]Step 1/4: Checking for Vector Formulas[/bold]")
     marked_pdf_path = str(pdf_path)
     vector_formulas = []
     
     try:
-        from .vector_formula_extractor import has_vector_formulas, process_pdf_with_markers
+        from .vector_formula_extractor import aprocess_pdf_with_markers
         
-        if has_vector_formulas(pdf_path):
-            console.print("  [cyan]Vector formulas detected - using marker method[/cyan]")
-            marked_pdf_path, vector_formulas = process_pdf_with_markers(pdf_path)
+        marked_pdf_path, vector_formulas = await aprocess_pdf_with_markers(pdf_path)
+        if vector_formulas:
             console.print(f"  [green]Prepared {len(vector_formulas)} formulas for replacement[/green]")
-        else:
-            console.print("  [dim]No vector formulas detected[/dim]")
     except Exception as e:
         console.print(f"  [yellow]Warning: Vector formula processing failed: {e}[/yellow]")
     
     # Step 2: Parse PDF (marked PDF if we have vector formulas)
-    console.print("\n[bold]Step 2/5: Parsing PDF[/bold]")
-    parsed = parse_pdf(
+    console.print("\n[bold]Step 2/4: Parsing PDF[/bold]")
+    parsed = await asyncio.to_thread(
+        parse_pdf,
         marked_pdf_path, 
         use_marker_method=bool(vector_formulas), 
         vector_formulas=vector_formulas
     )
     
     # Step 3: Process images (classify as formula or regular image)
-    console.print("\n[bold]Step 3/5: Processing Images[/bold]")
+    console.print("\n[bold]Step 3/4: Processing Images[/bold]")
     formulas = []
     
     if parsed.images:
-        from .image_describer import process_images
+        from .image_describer import aprocess_images
         
         # Process images - classify as formula or regular image
-        regular_images, image_formulas = process_images(parsed.images, parsed.text)
+        regular_images, image_formulas = await aprocess_images(parsed.images, parsed.text)
         
         # Keep only regular images (not formulas)
         parsed.images = regular_images
@@ -112,22 +112,25 @@ def ingest_pdf(pdf_path: str | Path) -> Dict[str, Any]:
     if parsed.images:
         save_image_descriptions_to_markdown(pdf_path, parsed.images)
     
-    # Step 4: Create chunks
-    console.print("\n[bold]Step 4/5: Creating Chunks[/bold]")
-    chunks = create_chunks(parsed)
-    console.print(f"  Created {len(chunks)} chunks")
+    # Step 4: Create chunks and store them in the vector DB
+    # Chunking, embedding and inserting overlap in a bounded async pipeline
+    console.print("\n[bold]Step 4/4: Chunking and Storing in Vector Database[/bold]")
+    chunk_types = Counter()
+    
+    def count_types(chunks):
+        for c in chunks:
+            chunk_types[c.chunk_type] += 1
+            yield c
+    
+    num_added = await add_chunks_async(count_types(create_chunks(parsed)))
+    num_chunks = chunk_types.total()
+    
+    console.print(f"  Created {num_chunks} chunks")
     
     # Show breakdown by type
-    chunk_types = {}
-    for c in chunks:
-        chunk_types[c.chunk_type] = chunk_types.get(c.chunk_type, 0) + 1
     for ctype, count in chunk_types.items():
         console.print(f"    - {ctype}: {count}")
     
-    # Step 5: Store in vector DB
-    console.print("\n[bold]Step 5/5: Storing in Vector Database[/bold]")
-    num_added = add_chunks(chunks)
-    
     stats = get_stats()
     console.print(f"\n[bold green]Ingestion complete![/bold green]")
     console.print(f"  Total documents in store: {stats['total_documents']}")
@@ -139,12 +142,22 @@ def ingest_pdf(pdf_path: str | Path) -> Dict[str, Any]:
         "images": len(parsed.images),
         "vector_formulas": len(vector_formulas),
         "formulas_from_images": len(formulas),
-        "chunks_created": len(chunks),
+        "chunks_created": num_chunks,
         "chunks_added": num_added,
         "total_in_store": stats["total_documents"]
     }
 
 
+def ingest_pdf(pdf_path: str | Path) -> Dict[str, Any]:
+    """
+    Blocking entry point for aingest_pdf().
+    
+    Starts the event loop the whole ingest runs on, so it must not be
+    called from a running loop; await aingest_pdf() there instead.
+    """
+    return asyncio.run(aingest_pdf(pdf_path))
+
+
 def query(question: str, stream: bool = False) -> str | None:
     """
     Query the RAG system.
@@ -190,15 +203,26 @@ def query(question: str, stream: bool = False) -> str | None:
     # Step 3: Rerank
     console.print(f"\n[bold]Step 3/4: Reranking to Top-{TOP_K_RERANK}[/bold]")
     top_results = rerank(question, results, top_k=TOP_K_RERANK)
-    console.print(f"  [green]✓[/green] Reranked to {len(top_results)} results")
+    # Literal queries skip the reranker and come back with rerank_score=None
+    reranked = any(r.get("rerank_score") is not None for r in top_results)
+    if reranked:
+        console.print(f"  [green]✓[/green] Reranked to {len(top_results)} results")
+    else:
+        console.print(f"  [dim]Literal query - kept top {len(top_results)} by similarity (not reranked)[/dim]")
     
     # Show AFTER reranking (FlashRank scores - higher = better)
-    console.print("\n[bold green]After Reranking (FlashRank Score - higher = better):[/bold green]")
+    if reranked:
+        console.print("\n[bold green]After Reranking (FlashRank Score - higher = better):[/bold green]")
+    else:
+        console.print("\n[bold green]Top Results (not reranked - ChromaDB distance, lower = better):[/bold green]")
     for i, r in enumerate(top_results, 1):
         chunk_type = r.get("metadata", {}).get("chunk_type", "text")
-        score = r.get("rerank_score", 0)
+        score = r.get("rerank_score")
         preview = r["content"][:80].replace("\n", " ")
-        console.print(f"  {i}. [{chunk_type}] (score: {score:.4f}) {preview}...")
+        if score is None:
+            console.print(f"  {i}. [{chunk_type}] (not reranked, dist: {r.get('distance', 0):.4f}) {preview}...")
+        else:
+            console.print(f"  {i}. [{chunk_type}] (score: {score:.4f}) {preview}...")
     
     # Step 4: Generate response
     console.print(f"\n[bold]Step 4/4: Generating Response[/bold]")
@@ -207,8 +231,11 @@ def query(question: str, stream: bool = False) -> str | None:
     if stream:
         console.print("\n[bold green]Response:[/bold green]")
         full_response = ""
+        # Raw tokens bypass Rich's markup parsing and rendering
+        out = console.file
         for chunk in stream_response(question, context):
-            console.print(chunk, end="")
+            out.write(chunk)
+            out.flush()
             full_response += chunk
         console.print("\n")
         return full_response
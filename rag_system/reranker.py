@@ -1,5 +1,9 @@
 """FlashRank reranking for CPU-optimized relevance scoring."""
-from typing import List, Dict, Any
+from collections import OrderedDict
+import re
+import threading
+import time
+from typing import List, Dict, Any, Hashable, Optional, Tuple
 from flashrank import Ranker, RerankRequest
 from rich.console import Console
 
@@ -7,24 +11,107 @@ from .config import RERANKER_MODEL, TOP_K_RERANK
 
 console = Console()
 
+# A LaTeX command, math operator, digit, or identifier punctuation (x.y, f(x))
+_FORMULA_TOKEN_RE = re.compile(r'\\[A-Za-z]+|[=^_<>+*/|{}\[\]]|\w[.(]\w|\d')
+
 # Global ranker instance
 _ranker = None
+_ranker_lock = threading.Lock()
+
+
+class _TTLCache:
+    """Small thread-safe LRU cache whose entries expire after ttl_sec."""
+    
+    def __init__(self, max_items: int, ttl_sec: float):
+        self.max_items = max_items
+        self.ttl_sec = ttl_sec
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_sec, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
 
 
-def get_ranker() -> Ranker:
-    """Get or initialize the FlashRank ranker."""
+# Reranked (index, score) order per (query, passages), reused within a session
+_score_cache = _TTLCache(max_items=4096, ttl_sec=900)
+
+
+def get_ranker(quiet: bool = False) -> Ranker:
+    """
+    Get or initialize the FlashRank ranker.
+    
+    Args:
+        quiet: Load without printing progress (for background warmup)
+    """
     global _ranker
     if _ranker is None:
-        console.print(f"[blue]Loading reranker model:[/blue] {RERANKER_MODEL}")
-        _ranker = Ranker(model_name=RERANKER_MODEL)
-        console.print("[green]✓ Reranker loaded[/green]")
+        # Guarded so a background warmup and the first real call load it once
+        with _ranker_lock:
+            if _ranker is None:
+                if not quiet:
+                    console.print(f"[blue]Loading reranker model:[/blue] {RERANKER_MODEL}")
+                _ranker = Ranker(model_name=RERANKER_MODEL)
+                if not quiet:
+                    console.print("[green]✓ Reranker loaded[/green]")
     return _ranker
 
 
+def warmup_ranker(quiet: bool = False) -> None:
+    """Load the reranker and score one dummy passage so ONNX Runtime allocates its buffers."""
+    get_ranker(quiet).rerank(RerankRequest(query="warmup", passages=[{"id": 0, "text": "warmup", "meta": {}}]))
+
+
+def _cache_key(query: str, results: List[Dict[str, Any]]) -> Tuple:
+    """Identify a rerank call by its query and the exact passages, in order."""
+    passages = []
+    for r in results:
+        meta = r.get("metadata", {})
+        # Content hash guards against re-ingested chunks reusing the same index
+        passages.append((meta.get("source_file"), meta.get("chunk_index"), hash(r["content"])))
+    return query, tuple(passages)
+
+
+def _is_literal(query: str) -> bool:
+    """
+    Whether a query is a literal lookup the cross-encoder can't improve on.
+    
+    Quoted phrases and queries made only of formula-like tokens (LaTeX,
+    math operators, identifiers such as x_i, f(x) or config.py) are matched
+    almost entirely by the vector search already. Queries with any plain
+    word, even short ones like "define entropy", are reranked.
+    """
+    query = query.strip()
+    if len(query) >= 2 and query.startswith('"') and query.endswith('"'):
+        return True
+    tokens = query.split()
+    return bool(tokens) and all(len(t) == 1 or _FORMULA_TOKEN_RE.search(t) for t in tokens)
+
+
 def rerank(query: str, results: List[Dict[str, Any]], top_k: int = TOP_K_RERANK) -> List[Dict[str, Any]]:
     """
     Rerank search results using FlashRank.
     
+    Scores for a repeated (query, passages) pair are served from an
+    in-process LRU cache (15 minute TTL) instead of re-running the model.
+    Literal queries (see _is_literal) keep the vector-search order and
+    get rerank_score=None.
+    
     Args:
         query: The search query
         results: List of search results with 'content' and 'metadata' keys
@@ -36,24 +123,32 @@ def rerank(query: str, results: List[Dict[str, Any]], top_k: int = TOP_K_RERANK)
     if not results:
         return []
     
-    ranker = get_ranker()
+    if _is_literal(query):
+        return [{**r, "rerank_score": None} for r in results[:top_k]]
+    
+    key = _cache_key(query, results)
+    ranked = _score_cache.get(key)
+    
+    if ranked is None:
+        ranker = get_ranker()
     
-    # Prepare passages for reranking
-    passages = [
-        {"id": i, "text": r["content"], "meta": r.get("metadata", {})}
-        for i, r in enumerate(results)
-    ]
+        # Prepare passages for reranking
+        passages = [
+            {"id": i, "text": r["content"], "meta": r.get("metadata", {})}
+            for i, r in enumerate(results)
+        ]
     
-    # Rerank
-    rerank_request = RerankRequest(query=query, passages=passages)
-    reranked = ranker.rerank(rerank_request)
+        # Rerank
+        rerank_request = RerankRequest(query=query, passages=passages)
+        reranked = ranker.rerank(rerank_request)
+        ranked = [(item["id"], item["score"]) for item in reranked]
+        _score_cache.set(key, ranked)
     
     # Get top-k and restore original structure
     top_results = []
-    for item in reranked[:top_k]:
-        original_idx = item["id"]
+    for original_idx, score in ranked[:top_k]:
         result = results[original_idx].copy()
-        result["rerank_score"] = item["score"]
+        result["rerank_score"] = score
         top_results.append(result)
     
     return top_results
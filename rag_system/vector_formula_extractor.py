@@ -6,16 +6,25 @@ This module uses the "Marker" method:
 2. Run Docling on the marked PDF - markers appear in markdown
 3. Replace markers with LaTeX extracted from formula images
 """
+import asyncio
+import base64
+import multiprocessing
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 import fitz  # PyMuPDF
+import numpy as np
 import tempfile
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Tuple
+from groq import AsyncGroq
 from rich.console import Console
 
-from .config import IMAGE_DIR
-from .image_describer import get_client, encode_image_base64
+from .cache import vision_cache_get, vision_cache_key, vision_cache_put
+from .config import IMAGE_DIR, PDF_PROCESS_WORKERS, SAVE_FORMULA_IMAGES, VISION_MAX_WORKERS
+from .groq_client import create_async_client, run_with_async_client
 from .latex_normalizer import normalize_latex
+from .pdf_workers import cluster_candidates, scan_formula_page
 
 console = Console()
 
@@ -70,29 +79,18 @@ def has_vector_formulas(pdf_path: str | Path, sample_pages: int = 3) -> bool:
             
             # Find vector drawing clusters
             clusters = page.cluster_drawings(x_tolerance=30, y_tolerance=4)
+            if not clusters:
+                continue
+            
+            # Skip table overlaps and header/footer regions
+            keep = cluster_candidates(clusters, table_bboxes, page.rect.height)
             
-            for rect in clusters:
-                # Skip if overlaps with table
-                overlap_area = 0
-                for table_bbox in table_bboxes:
-                    intersect = rect & table_bbox
-                    if not intersect.is_empty:
-                        overlap_area += intersect.get_area()
-                
-                if overlap_area > (rect.get_area() * 0.5):
-                    continue
-                
-                # Skip header/footer regions
-                if rect.y1 < 70 or rect.y0 > (page.rect.height - 70):
-                    continue
-                
-                # Check if it's large enough to be a formula
-                width = rect.x1 - rect.x0
-                height = rect.y1 - rect.y0
-                
-                # Formulas are typically wider than tall and reasonably sized
-                if width > 30 and height > 10 and width < page.rect.width * 0.9:
-                    formula_candidates += 1
+            # Formulas are typically wider than tall and reasonably sized
+            width = np.array([rect.x1 - rect.x0 for rect in clusters])
+            height = np.array([rect.y1 - rect.y0 for rect in clusters])
+            keep &= (width > 30) & (height > 10) & (width < page.rect.width * 0.9)
+            
+            formula_candidates += int(keep.sum())
         
         doc.close()
         
@@ -108,16 +106,21 @@ def create_marked_pdf_and_extract_formulas(pdf_path: str | Path) -> Tuple[str, L
     Create a copy of the PDF with text markers inserted at formula locations,
     and extract formula images.
     
+    Pages are scanned and formula crops rendered in parallel across
+    PDF_PROCESS_WORKERS processes; markers are then inserted and the
+    marked PDF saved in a single pass.
+    
     For each formula found:
     1. Insert a text marker like "##FORMULA_001##" at the formula location
-    2. Extract the formula as a PNG image
+    2. Extract the formula as PNG bytes (also written to disk if SAVE_FORMULA_IMAGES)
     
     Args:
         pdf_path: Path to the original PDF file
         
     Returns:
         Tuple of (path_to_marked_pdf, list_of_formula_info)
-        formula_info contains: marker, image_path, page_num
+        formula_info contains: marker, image_path (None unless saved),
+        image_bytes, page_num
     """
     pdf_path = Path(pdf_path)
     if not pdf_path.exists():
@@ -125,7 +128,8 @@ def create_marked_pdf_and_extract_formulas(pdf_path: str | Path) -> Tuple[str, L
     
     # Create output directory for formula images
     formulas_dir = IMAGE_DIR / pdf_path.stem / "vector_formulas"
-    formulas_dir.mkdir(parents=True, exist_ok=True)
+    if SAVE_FORMULA_IMAGES:
+        formulas_dir.mkdir(parents=True, exist_ok=True)
     
     # Open PDF for modification
     doc = fitz.open(pdf_path)
@@ -135,53 +139,34 @@ def create_marked_pdf_and_extract_formulas(pdf_path: str | Path) -> Tuple[str, L
     
     console.print(f"  [blue]Scanning {len(doc)} pages for vector formulas...[/blue]")
     
-    for page_num in range(len(doc)):
+    # Crops are rendered from the original file, BEFORE any marker is added
+    tasks = [(str(pdf_path), page_num) for page_num in range(len(doc))]
+    if not tasks:
+        page_candidates = []
+    else:
+        # Spawned, not forked: the parent may have model-loading threads running
+        with ProcessPoolExecutor(max_workers=min(PDF_PROCESS_WORKERS, len(tasks)),
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            # map() preserves page order, so marker numbering stays stable
+            page_candidates = list(executor.map(scan_formula_page, tasks, chunksize=4))
+    
+    for page_num, candidates in enumerate(page_candidates):
+        if not candidates:
+            continue
         page = doc[page_num]
         
-        # Find tables to exclude
-        tabs = page.find_tables()
-        table_bboxes = [tab.bbox for tab in tabs.tables]
-        
-        # Find vector drawing clusters
-        clusters = page.cluster_drawings(x_tolerance=30, y_tolerance=4)
-        
-        for rect in clusters:
-            # Skip if overlaps with table (>50%)
-            overlap_area = 0
-            for table_bbox in table_bboxes:
-                intersect = rect & table_bbox
-                if not intersect.is_empty:
-                    overlap_area += intersect.get_area()
-            
-            if overlap_area > (rect.get_area() * 0.5):
-                continue
-            
-            # Skip header/footer regions
-            if rect.y1 < 70 or rect.y0 > (page.rect.height - 70):
-                continue
-            
-            # Skip very small items
-            width = rect.x1 - rect.x0
-            height = rect.y1 - rect.y0
-            if width < 30 or height < 10:
-                continue
-            
-            # Extract formula as image BEFORE adding marker
-            mat = fitz.Matrix(4.0, 4.0)  # 4x scale for better quality
-            clip_rect = rect + (-3, -3, 3, 3)  # Small padding
-            pix = page.get_pixmap(matrix=mat, clip=clip_rect)
-            
-            # Skip near-blank images
-            if pix.color_count() < 3:
-                continue
+        for candidate in candidates:
+            rect = fitz.Rect(candidate["rect"])
+            image_bytes = candidate["image_bytes"]
             
             # Create unique marker
             marker = f"{FORMULA_MARKER_PREFIX}{formula_idx:03d}{FORMULA_MARKER_SUFFIX}"
             
-            # Save formula image
-            image_filename = f"formula_{formula_idx:03d}.png"
-            image_path = formulas_dir / image_filename
-            pix.save(str(image_path))
+            # Keep the PNG in memory for the vision call; disk copy is optional
+            image_path = None
+            if SAVE_FORMULA_IMAGES:
+                image_path = formulas_dir / f"formula_{formula_idx:03d}.png"
+                image_path.write_bytes(image_bytes)
             
             # Insert marker text at the formula location
             # Position it at the top-left of the formula rectangle
@@ -200,9 +185,10 @@ def create_marked_pdf_and_extract_formulas(pdf_path: str | Path) -> Tuple[str, L
             
             formulas.append({
                 "marker": marker,
-                "image_path": str(image_path),
+                "image_path": str(image_path) if image_path else None,
+                "image_bytes": image_bytes,
                 "page_num": page_num + 1,
-                "rect": (rect.x0, rect.y0, rect.x1, rect.y1),
+                "rect": candidate["rect"],
                 "index": formula_idx
             })
             
@@ -214,10 +200,10 @@ def create_marked_pdf_and_extract_formulas(pdf_path: str | Path) -> Tuple[str, L
         doc.close()
         return str(pdf_path), []
     
-    # Save marked PDF to temp file
+    # Save marked PDF to temp file, compacted (unused objects dropped, streams deflated)
     temp_dir = Path(tempfile.gettempdir())
     marked_pdf_path = temp_dir / f"{pdf_path.stem}_marked.pdf"
-    doc.save(str(marked_pdf_path))
+    doc.save(str(marked_pdf_path), garbage=3, deflate=True)
     doc.close()
     
     console.print(f"  [green]Created marked PDF: {marked_pdf_path.name}[/green]")
@@ -225,77 +211,135 @@ def create_marked_pdf_and_extract_formulas(pdf_path: str | Path) -> Tuple[str, L
     return str(marked_pdf_path), formulas
 
 
-def convert_formula_image_to_latex(image_path: str | Path) -> Optional[str]:
+def _build_formula_messages(image_bytes: bytes) -> List[Dict[str, Any]]:
+    """Build the vision request for a formula PNG."""
+    image_data = base64.b64encode(image_bytes).decode("ascii")
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": VECTOR_FORMULA_PROMPT},
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:image/png;base64,{image_data}"
+                    }
+                }
+            ]
+        }
+    ]
+
+
+def _clean_latex_response(content: str) -> Optional[str]:
+    """Strip code fences and math delimiters from a vision response."""
+    latex = content.strip()
+    
+    # Clean up common artifacts
+    latex = latex.replace("```latex", "").replace("```", "").strip()
+    latex = latex.strip("$")
+    
+    return latex if latex else None
+
+
+def _read_formula_bytes(image_path: Optional[str | Path], image_bytes: Optional[bytes]) -> Optional[bytes]:
+    """Formula PNG bytes, read from image_path when not already in memory."""
+    if image_bytes is not None:
+        return image_bytes
+    if image_path is None or not Path(image_path).exists():
+        return None
+    return Path(image_path).read_bytes()
+
+
+async def aconvert_formula_image_to_latex(client: AsyncGroq, image_path: Optional[str | Path],
+                                          image_bytes: Optional[bytes] = None) -> Optional[str]:
     """
     Send a formula image to the vision model and extract LaTeX.
     
+    Results are cached by image content in the vision cache, so
+    re-ingesting a PDF (or one sharing formulas) skips the API call.
+    
     Args:
+        client: AsyncGroq client shared by the batch
         image_path: Path to the formula PNG image
-        
+        image_bytes: PNG bytes of the formula; read from image_path if omitted
+    
     Returns:
         LaTeX string, or None if extraction failed
     """
     from .config import VISION_MODEL
     
-    image_path = Path(image_path)
-    if not image_path.exists():
-        return None
-    
     try:
-        client = get_client()
+        image_bytes = await asyncio.to_thread(_read_formula_bytes, image_path, image_bytes)
+        if image_bytes is None:
+            return None
         
-        image_data = encode_image_base64(image_path)
+        cache_key = vision_cache_key(image_bytes, "vector_latex")
+        cached = vision_cache_get(cache_key)
+        if cached is not None:
+            return cached[1]
         
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model=VISION_MODEL,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": VECTOR_FORMULA_PROMPT},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/png;base64,{image_data}"
-                            }
-                        }
-                    ]
-                }
-            ],
+            messages=_build_formula_messages(image_bytes),
             max_tokens=500
         )
         
-        latex = response.choices[0].message.content.strip()
-        
-        # Clean up common artifacts
-        latex = latex.replace("```latex", "").replace("```", "").strip()
-        latex = latex.strip("$")
-        
-        return latex if latex else None
-        
+        latex = _clean_latex_response(response.choices[0].message.content)
+        if latex:
+            vision_cache_put(cache_key, (True, latex, ""))
+        return latex
+    
     except Exception as e:
         console.print(f"[yellow]Warning: Could not convert formula image: {e}[/yellow]")
         return None
 
 
-def convert_all_formulas_to_latex(formulas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def convert_formula_image_to_latex(image_path: Optional[str | Path], image_bytes: Optional[bytes] = None) -> Optional[str]:
+    """Blocking wrapper around aconvert_formula_image_to_latex() for one-off calls."""
+    try:
+        return run_with_async_client(aconvert_formula_image_to_latex, image_path, image_bytes)
+    except ValueError as e:
+        console.print(f"[yellow]Warning: Could not convert formula image: {e}[/yellow]")
+        return None
+
+
+async def aconvert_all_formulas_to_latex(formulas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     Convert all formula images to LaTeX.
     
+    Images are sent to the vision model concurrently (up to
+    VISION_MAX_WORKERS at a time); results are reported in formula order.
+    
     Args:
-        formulas: List of formula dicts with 'image_path' key
-        
+        formulas: List of formula dicts with 'image_bytes' or 'image_path' key
+    
     Returns:
         Updated list with 'latex' key added
     """
     console.print(f"  [blue]Converting {len(formulas)} formulas to LaTeX...[/blue]")
     
-    for i, formula_info in enumerate(formulas):
-        image_path = formula_info["image_path"]
+    semaphore = asyncio.Semaphore(VISION_MAX_WORKERS)
+    
+    try:
+        # One client per event loop: async connection pools can't outlive their loop
+        client = create_async_client()
+    except ValueError as e:
+        console.print(f"[yellow]Warning: Could not convert formula images: {e}[/yellow]")
+        latex_results = [None] * len(formulas)
+    else:
+        async with client:
+            async def convert(formula_info: Dict[str, Any]) -> Optional[str]:
+                async with semaphore:
+                    return await aconvert_formula_image_to_latex(
+                        client, formula_info.get("image_path"), formula_info.get("image_bytes")
+                    )
+            
+            # Vision requests run concurrently; results come back in formula order
+            latex_results = await asyncio.gather(*(convert(f) for f in formulas))
+    
+    for i, (formula_info, latex) in enumerate(zip(formulas, latex_results)):
         console.print(f"    Processing formula {i + 1}/{len(formulas)}...")
         
-        latex = convert_formula_image_to_latex(image_path)
-        
         if latex:
             formula_info["latex"] = latex
             formula_info["normalized"] = normalize_latex(latex)
@@ -314,6 +358,9 @@ def replace_markers_with_latex(markdown_text: str, formulas: List[Dict[str, Any]
     """
     Replace formula markers in markdown with actual LaTeX.
     
+    All markers are matched by one compiled alternation, so the markdown
+    is scanned and rebuilt once regardless of how many formulas there are.
+    
     Args:
         markdown_text: Markdown text containing markers like ##FORMULA_001##
         formulas: List of formula dicts with 'marker' and 'latex' keys
@@ -321,26 +368,38 @@ def replace_markers_with_latex(markdown_text: str, formulas: List[Dict[str, Any]
     Returns:
         Markdown with markers replaced by LaTeX
     """
-    result = markdown_text
-    replaced_count = 0
+    # Replace each marker with display math
+    replacements = {
+        f["marker"]: f"\n\n$${f['latex']}$$\n\n"
+        for f in formulas
+        if f.get("marker") and f.get("latex")
+    }
+    if not replacements:
+        console.print("  [green]Replaced 0 markers with LaTeX[/green]")
+        return markdown_text
+    
+    # Longest first so no marker can shadow a longer one sharing its prefix
+    pattern = re.compile("|".join(map(re.escape, sorted(replacements, key=len, reverse=True))))
+    
+    found = set()
+    
+    def substitute(match):
+        found.add(match.group(0))
+        return replacements[match.group(0)]
+    
+    result = pattern.sub(substitute, markdown_text)
     
     for formula_info in formulas:
-        marker = formula_info.get("marker", "")
-        latex = formula_info.get("latex")
-        
-        if marker and latex and marker in result:
-            # Replace marker with display math
-            replacement = f"\n\n$${latex}$$\n\n"
-            result = result.replace(marker, replacement)
-            replaced_count += 1
-            console.print(f"    [cyan]Replaced[/cyan] {marker} -> {latex[:40]}...")
+        marker = formula_info.get("marker")
+        if marker in found:
+            console.print(f"    [cyan]Replaced[/cyan] {marker} -> {formula_info['latex'][:40]}...")
     
-    console.print(f"  [green]Replaced {replaced_count} markers with LaTeX[/green]")
+    console.print(f"  [green]Replaced {len(found)} markers with LaTeX[/green]")
     
     return result
 
 
-def process_pdf_with_markers(pdf_path: str | Path) -> Tuple[str, List[Dict[str, Any]]]:
+async def aprocess_pdf_with_markers(pdf_path: str | Path) -> Tuple[str, List[Dict[str, Any]]]:
     """
     Main entry point: Process PDF with marker method.
     
@@ -363,19 +422,24 @@ def process_pdf_with_markers(pdf_path: str | Path) -> Tuple[str, List[Dict[str,
     
     console.print(f"\n[bold cyan]Processing PDF with marker method: {pdf_path.name}[/bold cyan]")
     
-    # Step 1: Create marked PDF and extract formula images
-    marked_pdf_path, formulas = create_marked_pdf_and_extract_formulas(pdf_path)
+    # Step 1: Create marked PDF and extract formula images (off the event loop)
+    marked_pdf_path, formulas = await asyncio.to_thread(create_marked_pdf_and_extract_formulas, pdf_path)
     
     if not formulas:
         console.print("  [yellow]No vector formulas found[/yellow]")
         return str(pdf_path), []
     
     # Step 2: Convert formula images to LaTeX
-    formulas = convert_all_formulas_to_latex(formulas)
+    formulas = await aconvert_all_formulas_to_latex(formulas)
     
     return marked_pdf_path, formulas
 
 
+def process_pdf_with_markers(pdf_path: str | Path) -> Tuple[str, List[Dict[str, Any]]]:
+    """Blocking entry point for aprocess_pdf_with_markers(); don't call it from a running event loop."""
+    return asyncio.run(aprocess_pdf_with_markers(pdf_path))
+
+
 # Keep old functions for backwards compatibility
 def extract_vector_formulas(pdf_path: str | Path) -> List[Dict[str, Any]]:
     """DEPRECATED: Use process_pdf_with_markers instead."""
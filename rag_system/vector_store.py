@@ -1,10 +1,16 @@
 """ChromaDB vector store operations."""
-from typing import List, Dict, Any, Optional
+import asyncio
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 import chromadb
+import numpy as np
 from chromadb.config import Settings
 from rich.console import Console
 
-from .config import CHROMA_DIR, COLLECTION_NAME
+from .config import (
+    CHROMA_DIR, CHROMA_HOST, CHROMA_PORT, COLLECTION_NAME, CHROMA_BATCH_SIZE, INGEST_BATCH_SIZE,
+    HNSW_M, HNSW_CONSTRUCTION_EF, HNSW_SEARCH_EF
+)
 from .chunker import Chunk
 from .embedder import embed_texts
 
@@ -14,33 +20,115 @@ console = Console()
 _client = None
 _collection = None
 
+# Embeddings are unit-norm (FastEmbed L2-normalizes BGE output), so
+# cosine distance is just 1 - dot product with no per-query norms
+_COLLECTION_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:M": HNSW_M,
+    "hnsw:construction_ef": HNSW_CONSTRUCTION_EF,
+    "hnsw:search_ef": HNSW_SEARCH_EF,
+}
+
 
 def get_collection():
     """Get or initialize the ChromaDB collection."""
     global _client, _collection
     
     if _collection is None:
-        console.print(f"[blue]Initializing ChromaDB at:[/blue] {CHROMA_DIR}")
-        _client = chromadb.PersistentClient(
-            path=str(CHROMA_DIR),
-            settings=Settings(anonymized_telemetry=False)
-        )
+        if CHROMA_HOST:
+            console.print(f"[blue]Connecting to ChromaDB server:[/blue] {CHROMA_HOST}:{CHROMA_PORT}")
+            _client = chromadb.HttpClient(
+                host=CHROMA_HOST,
+                port=CHROMA_PORT,
+                settings=Settings(anonymized_telemetry=False)
+            )
+        else:
+            console.print(f"[blue]Initializing ChromaDB at:[/blue] {CHROMA_DIR}")
+            _client = chromadb.PersistentClient(
+                path=str(CHROMA_DIR),
+                settings=Settings(anonymized_telemetry=False)
+            )
         _collection = _client.get_or_create_collection(
             name=COLLECTION_NAME,
-            metadata={"hnsw:space": "cosine"}
+            metadata=_COLLECTION_METADATA
         )
         console.print(f"[green]✓ Collection ready:[/green] {_collection.count()} documents")
     
     return _collection
 
 
-def add_chunks(chunks: List[Chunk]) -> int:
+def _prepare_chunks(chunks: List[Chunk]) -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
+    """Build the parallel (texts, ids, metadatas) lists Chroma expects."""
+    texts = [c.content for c in chunks]
+    ids = [f"{c.source_file}_{c.chunk_index}" for c in chunks]
+    metadatas = []
+    for c in chunks:
+        meta = c.metadata.copy()
+        meta["chunk_type"] = c.chunk_type
+        meta["source_file"] = c.source_file
+        meta["chunk_index"] = c.chunk_index
+        # Add formula_latex for formula chunks (for rendering during retrieval)
+        if c.formula_latex:
+            meta["formula_latex"] = c.formula_latex
+        metadatas.append(meta)
+    return texts, ids, metadatas
+
+
+def _slabs(texts: List[str], ids: List[str], metadatas: List[Dict[str, Any]],
+           embeddings: np.ndarray) -> Iterator[Dict[str, Any]]:
+    """
+    Split prepared records into collection.add() keyword arguments.
+    
+    Records are added in large slabs to amortize per-call index overhead.
+    Shared by the sync and async insert paths.
+    """
+    for start in range(0, len(ids), CHROMA_BATCH_SIZE):
+        end = start + CHROMA_BATCH_SIZE
+        yield {
+            "documents": texts[start:end],
+            # Python lists only at the Chroma boundary (older clients reject ndarrays)
+            "embeddings": embeddings[start:end].tolist(),
+            "metadatas": metadatas[start:end],
+            "ids": ids[start:end],
+        }
+
+
+def _insert(collection, texts: List[str], ids: List[str], metadatas: List[Dict[str, Any]], embeddings: np.ndarray) -> None:
+    """Write prepared records to the collection."""
+    for slab in _slabs(texts, ids, metadatas, embeddings):
+        collection.add(**slab)
+
+
+async def _ainsert(collection, texts: List[str], ids: List[str], metadatas: List[Dict[str, Any]], embeddings: np.ndarray) -> None:
+    """Async version of _insert() for an AsyncHttpClient collection."""
+    for slab in _slabs(texts, ids, metadatas, embeddings):
+        await collection.add(**slab)
+
+
+async def _get_async_collection():
+    """Open the collection on the Chroma server with the async HTTP client."""
+    client = await chromadb.AsyncHttpClient(
+        host=CHROMA_HOST,
+        port=CHROMA_PORT,
+        settings=Settings(anonymized_telemetry=False)
+    )
+    return await client.get_or_create_collection(
+        name=COLLECTION_NAME,
+        metadata=_COLLECTION_METADATA
+    )
+
+
+def add_chunks(chunks: List[Chunk], batch_size: int = INGEST_BATCH_SIZE) -> int:
     """
     Add chunks to the vector store.
     
+    Chunks are embedded and inserted one batch at a time, so only a
+    single batch of vectors and metadata is held in memory.
+    
     Args:
         chunks: List of Chunk objects to add
-        
+        batch_size: Chunks embedded and inserted per batch
+    
     Returns:
         Number of chunks added
     """
@@ -49,39 +137,81 @@ def add_chunks(chunks: List[Chunk]) -> int:
     
     collection = get_collection()
     
-    # Prepare data
-    texts = [c.content for c in chunks]
-    ids = [f"{c.source_file}_{c.chunk_index}" for c in chunks]
-    metadatas = []
-    for c in chunks:
-        meta = {
-            "chunk_type": c.chunk_type,
-            "source_file": c.source_file,
-            "chunk_index": c.chunk_index,
-            **c.metadata
-        }
-        # Add formula_latex for formula chunks (for rendering during retrieval)
-        if c.formula_latex:
-            meta["formula_latex"] = c.formula_latex
-        metadatas.append(meta)
-    
-    # Generate embeddings
-    console.print(f"[blue]Generating embeddings for {len(texts)} chunks...[/blue]")
-    embeddings = embed_texts(texts)
+    console.print(f"[blue]Generating embeddings for {len(chunks)} chunks...[/blue]")
+    for start in range(0, len(chunks), batch_size):
+        # Prepare data
+        texts, ids, metadatas = _prepare_chunks(chunks[start:start + batch_size])
+        
+        # Generate embeddings
+        embeddings = embed_texts(texts)
     
-    # Add to collection
-    collection.add(
-        documents=texts,
-        embeddings=embeddings,
-        metadatas=metadatas,
-        ids=ids
-    )
+        _insert(collection, texts, ids, metadatas, embeddings)
+        del texts, ids, metadatas, embeddings
     
     console.print(f"[green]✓ Added {len(chunks)} chunks to vector store[/green]")
     return len(chunks)
 
 
-def search(query_embedding: List[float], top_k: int = 20) -> List[Dict[str, Any]]:
+async def add_chunks_async(chunks: Iterable[Chunk], batch_size: int = INGEST_BATCH_SIZE) -> int:
+    """
+    Chunk, embed and store a stream of chunks as an overlapped pipeline.
+    
+    Three stages run concurrently, connected by bounded queues: pulling
+    batches from the chunk iterator, embedding them, and inserting them
+    into Chroma. While one batch is being inserted the next is already
+    being embedded and the one after that tokenized.
+    
+    With CHROMA_HOST set, inserts go through Chroma's AsyncHttpClient
+    and are awaited on the loop; the local store (or a server on a
+    chromadb without AsyncHttpClient) is written off-loop.
+    
+    Args:
+        chunks: Iterable of Chunk objects (typically the create_chunks generator)
+        batch_size: Chunks per batch handed between stages
+    
+    Returns:
+        Number of chunks added
+    """
+    # AsyncHttpClient only exists in newer chromadb releases
+    use_async_client = bool(CHROMA_HOST) and hasattr(chromadb, "AsyncHttpClient")
+    if use_async_client:
+        collection = await _get_async_collection()
+    else:
+        collection = await asyncio.to_thread(get_collection)
+    q_chunks: asyncio.Queue = asyncio.Queue(maxsize=4)
+    q_vecs: asyncio.Queue = asyncio.Queue(maxsize=4)
+    iterator = iter(chunks)
+    
+    async def produce():
+        # The chunk generator does the tokenization, so pull from it off-loop
+        while batch := await asyncio.to_thread(lambda: list(islice(iterator, batch_size))):
+            await q_chunks.put(batch)
+        await q_chunks.put(None)
+    
+    async def embed_worker():
+        while (batch := await q_chunks.get()) is not None:
+            texts, ids, metadatas = _prepare_chunks(batch)
+            console.print(f"[blue]Generating embeddings for {len(texts)} chunks...[/blue]")
+            embeddings = await asyncio.to_thread(embed_texts, texts)
+            await q_vecs.put((texts, ids, metadatas, embeddings))
+        await q_vecs.put(None)
+    
+    async def insert_worker() -> int:
+        added = 0
+        while (item := await q_vecs.get()) is not None:
+            if use_async_client:
+                await _ainsert(collection, *item)
+            else:
+                await asyncio.to_thread(_insert, collection, *item)
+            added += len(item[1])
+            console.print(f"[green]✓ Added {len(item[1])} chunks to vector store[/green]")
+        return added
+    
+    _, _, added = await asyncio.gather(produce(), embed_worker(), insert_worker())
+    return added
+
+
+def search(query_embedding: np.ndarray, top_k: int = 20) -> List[Dict[str, Any]]:
     """
     Search for similar documents.
     
@@ -92,24 +222,36 @@ def search(query_embedding: List[float], top_k: int = 20) -> List[Dict[str, Any]
     Returns:
         List of results with document, metadata, and distance
     """
+    return search_batch(np.asarray(query_embedding)[None, :], top_k)[0]
+
+
+def search_batch(query_embeddings: np.ndarray, top_k: int = 20) -> List[List[Dict[str, Any]]]:
+    """
+    Search for several queries in one collection query.
+    
+    Args:
+        query_embeddings: (num_queries, dim) array of query embeddings
+        top_k: Number of results to return per query
+    
+    Returns:
+        One result list per query, each as returned by search()
+    """
     collection = get_collection()
     
     results = collection.query(
-        query_embeddings=[query_embedding],
+        query_embeddings=np.asarray(query_embeddings).tolist(),
         n_results=top_k,
         include=["documents", "metadatas", "distances"]
     )
     
     # Format results
-    formatted = []
-    for i in range(len(results["documents"][0])):
-        formatted.append({
-            "content": results["documents"][0][i],
-            "metadata": results["metadatas"][0][i],
-            "distance": results["distances"][0][i]
-        })
-    
-    return formatted
+    return [
+        [
+            {"content": doc, "metadata": meta, "distance": dist}
+            for doc, meta, dist in zip(docs, metas, dists)
+        ]
+        for docs, metas, dists in zip(results["documents"], results["metadatas"], results["distances"])
+    ]
 
 
 def clear_collection():
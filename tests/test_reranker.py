@@ -0,0 +1,60 @@
+"""Tests for the literal-query shortcut in the reranker."""
+import pytest
+
+pytest.importorskip("flashrank")
+
+from rag_system import reranker
+from rag_system.reranker import _is_literal, rerank
+
+
+@pytest.mark.parametrize("query", [
+    '"heat loss coefficient"',
+    "E=mc^2",
+    "E = mc^2",
+    r"\frac{a}{b}",
+    r"\nabla f",
+    "x_i",
+    "f(x)",
+    "config.py",
+])
+def test_quoted_and_formula_queries_are_literal(query):
+    assert _is_literal(query)
+
+
+@pytest.mark.parametrize("query", [
+    "define entropy",
+    "softmax derivative",
+    "entropy",
+    "what is x^2",
+    "",
+])
+def test_word_queries_are_reranked(query):
+    assert not _is_literal(query)
+
+
+def test_literal_query_keeps_vector_order(monkeypatch):
+    def fail():
+        raise AssertionError("literal queries must not load the ranker")
+    
+    monkeypatch.setattr(reranker, "get_ranker", fail)
+    results = [{"content": f"passage {i}", "metadata": {}} for i in range(5)]
+    
+    top = rerank("x_i", results, top_k=3)
+    
+    assert [r["content"] for r in top] == ["passage 0", "passage 1", "passage 2"]
+    assert all(r["rerank_score"] is None for r in top)
+
+
+def test_word_query_is_scored_by_ranker(monkeypatch):
+    class FakeRanker:
+        def rerank(self, request):
+            # Reverse the vector order so reranking is observable
+            return [{"id": p["id"], "score": float(p["id"])} for p in reversed(request.passages)]
+    
+    monkeypatch.setattr(reranker, "get_ranker", FakeRanker)
+    results = [{"content": f"passage {i}", "metadata": {}} for i in range(3)]
+    
+    top = rerank("define entropy", results, top_k=2)
+    
+    assert [r["content"] for r in top] == ["passage 2", "passage 1"]
+    assert [r["rerank_score"] for r in top] == [2.0, 1.0]